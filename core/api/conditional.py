@@ -0,0 +1,63 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+from fastapi import Request, Response, status
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong entity tag from values identifying representation version, e.g. id and time_updated."""
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == '*':
+        return True
+    # If-None-Match uses weak comparison, so W/ prefix is ignored
+    tags = (tag.strip() for tag in header.split(','))
+    return any((tag[2:] if tag.startswith('W/') else tag) == etag for tag in tags)
+
+
+def _not_modified_since(header: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # HTTP dates have second precision
+    return last_modified.replace(microsecond=0) <= since
+
+
+def _validators(etag: str, last_modified: Optional[datetime]) -> Dict[str, str]:
+    headers = {'ETag': etag}
+    if last_modified is not None:
+        headers['Last-Modified'] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+    return headers
+
+
+def is_conditional(request: Request) -> bool:
+    return 'if-none-match' in request.headers or 'if-modified-since' in request.headers
+
+
+def not_modified_response(request: Request, etag: str, last_modified: Optional[datetime] = None) -> Optional[Response]:
+    """304 Not Modified response, when client's copy is still valid, otherwise None."""
+    if_none_match = request.headers.get('if-none-match')
+    if_modified_since = request.headers.get('if-modified-since')
+    # If-Modified-Since is ignored, when If-None-Match is present (RFC 7232, section 6)
+    if if_none_match is not None:
+        not_modified = _etag_matches(if_none_match, etag)
+    elif if_modified_since is not None and last_modified is not None:
+        not_modified = _not_modified_since(if_modified_since, last_modified)
+    else:
+        not_modified = False
+
+    if not not_modified:
+        return None
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=_validators(etag, last_modified))
+
+
+def set_validators(response: Response, etag: str, last_modified: Optional[datetime] = None) -> None:
+    response.headers.update(_validators(etag, last_modified))
@@ -1,69 +1,133 @@
-from typing import Dict, Union, Optional
+import hashlib
+import inspect
+import time
+from typing import Any, Dict, List, Optional, Type, Union
 
-from fastapi import HTTPException, status, Security, Depends
-from fastapi.security import SecurityScopes, HTTPAuthorizationCredentials, HTTPBearer
+from fastapi import HTTPException, status, Security, Depends, Query
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import jwt, JWTError
-from sqlalchemy import select
-from sqlalchemy.engine.result import ChunkedIteratorResult
+from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from core.config import JOSE
+from core.config import JOSE, PAGINATION
 from db.database import get_db
-from models.user import User
+from schemas.user import UserSchema
+from services.base import BaseService
+from services.cache import InMemoryCache
+from services.user import get_principal
 
 oauth_scheme = HTTPBearer()
 
+# payloads of tokens with already verified signature, kept per process until token expiration
+verified_tokens = InMemoryCache(max_size=JOSE['VERIFIED_TOKENS_CACHE_SIZE'])
 
-async def verify_jwt_scopes(
-    security_scopes: SecurityScopes,
-    token: HTTPAuthorizationCredentials = Security(oauth_scheme)
-):
-    if security_scopes.scopes:
-        authenticate_value = f'Bearer scope="{security_scopes.scope_str}"'
-    else:
-        authenticate_value = 'Bearer'
 
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail='Could not validate credentials',
-        headers={'WWW-Authenticate': authenticate_value}
-    )
+class PaginationParams:
+    def __init__(
+        self,
+        cursor: Optional[str] = Query(None, description='Opaque cursor from "next_cursor" of the previous page'),
+        limit: int = Query(PAGINATION['DEFAULT_LIMIT'], ge=1, le=PAGINATION['MAX_LIMIT']),
+    ) -> None:
+        self.cursor = cursor
+        self.limit = limit
 
-    try:
-        payload: Dict[str, Union[int, str]] = jwt.decode(token.credentials, JOSE['SECRET_KEY'], algorithms=JOSE['ALGORITHM'])
-    except JWTError:
-        raise credentials_exception
 
-    scope = payload.get('scope', None)
-    if not scope:
-        raise credentials_exception
+class FieldsParams:
+    """Sparse fieldset of list items, e.g. ?fields=id,title; None means every field of schema."""
+
+    def __init__(self, schema: Type[BaseModel]) -> None:
+        self.schema = schema
+
+    def __call__(
+        self,
+        fields: Optional[str] = Query(None, description='Comma-separated fields of items to return, all by default'),
+    ) -> Optional[List[str]]:
+        if fields is None:
+            return None
+
+        requested = {field.strip() for field in fields.split(',')} - {''}
+        unknown = requested - set(self.schema.__fields__)
+        if not requested:
+            raise HTTPException(status_code=400, detail="No fields requested!")
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}!")
+        # schema order, so equal fieldsets give equal responses
+        return [field for field in self.schema.__fields__ if field in requested]
+
+
+class ListFilters:
+    def __init__(self, values: Dict[str, Any], order: Optional[str]) -> None:
+        self.values = values
+        self.order = order
+
+
+class FilterParams:
+    """Whitelisted filters and ordering of service list, e.g. ?validated=true&order=-time_created.
 
-    if scope not in security_scopes.scopes:
+    Query parameters are declared after BaseService.filters and BaseService.orderings of the service,
+    so values are typed and documented in OpenAPI schema like any other parameter.
+    """
+
+    def __init__(self, service: Type[BaseService]) -> None:
+        parameters = [
+            inspect.Parameter(
+                name, inspect.Parameter.KEYWORD_ONLY,
+                default=Query(None, description=filter.description), annotation=Optional[filter.python_type],
+            )
+            for name, filter in service.filters.items()
+        ]
+        orderings = '|'.join(service.orderings)
+        parameters.append(inspect.Parameter(
+            'order', inspect.Parameter.KEYWORD_ONLY, annotation=Optional[str],
+            default=Query(None, regex=f'^-?({orderings})$', description='Field to order by, "-" prefix for descending'),
+        ))
+        self.__signature__ = inspect.Signature(parameters)
+
+    def __call__(self, order: Optional[str] = None, **values: Any) -> ListFilters:
+        return ListFilters(values, order)
+
+
+async def decode_token(token: HTTPAuthorizationCredentials = Security(oauth_scheme)) -> Dict[str, Union[int, str]]:
+    """Decodes bearer token once per request, FastAPI caches result for every dependant.
+
+    Signature of a token seen before is not verified again while the token is not expired.
+    """
+    key = hashlib.sha256(token.credentials.encode()).hexdigest()
+    payload: Optional[Dict[str, Union[int, str]]] = await verified_tokens.get(key)
+    if payload is not None:
+        return payload
+
+    try:
+        payload = jwt.decode(token.credentials, JOSE['SECRET_KEY'], algorithms=JOSE['ALGORITHM'])
+    except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail='Not enough permissions!',
-            headers={'WWW-Authenticate': authenticate_value}
+            detail='Could not validate credentials',
+            headers={'WWW-Authenticate': 'Bearer'}
         )
 
+    expires_in = payload.get('exp', 0) - time.time()
+    if expires_in > 0:
+        await verified_tokens.set(key, payload, ttl=expires_in)
+    return payload
+
 
 async def get_current_user(
-    token: HTTPAuthorizationCredentials = Security(oauth_scheme), 
+    payload: Dict[str, Union[int, str]] = Depends(decode_token),
     session: AsyncSession = Depends(get_db)
-) -> Optional[User]:
+) -> UserSchema:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload: Dict[str, Union[int, str]] = jwt.decode(token.credentials, JOSE['SECRET_KEY'], algorithms=JOSE['ALGORITHM'])
-    except JWTError:
-        raise credentials_exception
-
     email = payload.get('email', None)
     if not email:
         raise credentials_exception
 
-    res: ChunkedIteratorResult = await session.execute(select(User).where(User.email == email))
-    user: User = res.scalar()
+    user = await get_principal(email, session)
+    if user is None:
+        raise credentials_exception
+    if not user.active:
+        raise HTTPException(status_code=403, detail="User not active!")
     return user
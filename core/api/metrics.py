@@ -0,0 +1,236 @@
+import asyncio
+import bisect
+import glob
+import json
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from fastapi import APIRouter, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.config import METRICS
+from db.database import pool_stats
+
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+# label of requests not matching any route, path would make cardinality unbounded
+UNMATCHED_ROUTE = '<unmatched>'
+
+# per label values: observation counts per bucket (not cumulative, last one is +Inf), then sum
+Series = Dict[Tuple[str, ...], List[float]]
+
+
+class Histograms:
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = tuple(buckets)
+        self.series: Series = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float) -> None:
+        values = self.series.get(labels)
+        if values is None:
+            values = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        values[bisect.bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+
+class MetricsRegistry:
+    """Request metrics of the worker process, rendered in Prometheus text format.
+
+    With multiprocess_dir, every worker writes its metrics there as a snapshot file each flush_interval
+    seconds, and any worker serves metrics of all of them: histograms and counters are summed over all
+    snapshots, those of exited workers included, gauges over live workers only. The directory
+    must be emptied before the server starts, pids of a previous run could be taken again.
+    """
+
+    def __init__(
+        self, latency_buckets: Sequence[float], multiprocess_dir: Optional[str] = None, flush_interval: float = 5.0,
+    ) -> None:
+        self.latency = Histograms(latency_buckets)
+        self.sizes = Histograms(SIZE_BUCKETS)
+        self.in_flight = 0
+        self.multiprocess_dir = multiprocess_dir
+        self.flush_interval = flush_interval
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def observe(self, method: str, route: str, status: int, seconds: float, size: int) -> None:
+        self.latency.observe((method, route, str(status)), seconds)
+        self.sizes.observe((method, route), size)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'pid': os.getpid(),
+            'latency': dump(self.latency.series),
+            'sizes': dump(self.sizes.series),
+            'in_flight': self.in_flight,
+            'db_pool': pool_stats(),
+        }
+
+    def _snapshot_path(self, pid: int) -> str:
+        return os.path.join(self.multiprocess_dir, f'metrics_{pid}.json')
+
+    def flush(self) -> None:
+        path = self._snapshot_path(os.getpid())
+        with open(f'{path}.tmp', 'w') as file:
+            json.dump(self.snapshot(), file)
+        # readers never see a partially written snapshot
+        os.replace(f'{path}.tmp', path)
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+    async def start(self) -> None:
+        if self.multiprocess_dir and self._flush_task is None:
+            os.makedirs(self.multiprocess_dir, exist_ok=True)
+            self.flush()
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_periodically())
+
+    async def stop(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+            self.flush()
+
+    def snapshots(self) -> List[Dict[str, Any]]:
+        snapshots = [self.snapshot()]
+        if not self.multiprocess_dir:
+            return snapshots
+        for path in glob.glob(os.path.join(self.multiprocess_dir, 'metrics_*.json')):
+            try:
+                with open(path) as file:
+                    snapshot = json.load(file)
+            except (OSError, ValueError):
+                continue
+            if snapshot['pid'] != os.getpid():
+                snapshot['alive'] = pid_alive(snapshot['pid'])
+                snapshots.append(snapshot)
+        return snapshots
+
+    def render(self) -> str:
+        snapshots = self.snapshots()
+        live = [snapshot for snapshot in snapshots if snapshot.get('alive', True)]
+        lines: List[str] = []
+        render_histogram(
+            lines, 'http_request_duration_seconds', 'Request latency by route and status.',
+            ('method', 'route', 'status'), self.latency.buckets, merge(snapshot['latency'] for snapshot in snapshots),
+        )
+        render_histogram(
+            lines, 'http_response_size_bytes', 'Response body size by route.',
+            ('method', 'route'), SIZE_BUCKETS, merge(snapshot['sizes'] for snapshot in snapshots),
+        )
+        render_metric(lines, 'http_requests_in_flight', 'gauge', 'Requests being processed.', sum(
+            snapshot['in_flight'] for snapshot in live
+        ))
+
+        # connection pool of every worker, see db.database.pool_stats
+        for key, kind, description in (
+            ('size', 'gauge', 'Connections kept in the pools.'),
+            ('in_use', 'gauge', 'Connections checked out of the pools.'),
+            ('idle', 'gauge', 'Connections idle in the pools.'),
+            ('overflow', 'gauge', 'Connections opened above pool size.'),
+        ):
+            render_metric(lines, f'db_pool_{key}', kind, description, sum(snapshot['db_pool'][key] for snapshot in live))
+        for key, name, description in (
+            ('checkouts', 'db_pool_checkouts_total', 'Connections checked out of the pools.'),
+            ('timeouts', 'db_pool_timeouts_total', 'Checkouts timed out waiting for a connection.'),
+            ('wait_seconds_total', 'db_pool_wait_seconds_total', 'Time spent waiting for a connection.'),
+        ):
+            render_metric(lines, name, 'counter', description, sum(snapshot['db_pool'][key] for snapshot in snapshots))
+        return '\n'.join(lines) + '\n'
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def dump(series: Series) -> List[Dict[str, list]]:
+    return [{'labels': list(labels), 'values': values} for labels, values in series.items()]
+
+
+def merge(all_series: Iterable[List[Dict[str, list]]]) -> Series:
+    merged: Series = {}
+    for series in all_series:
+        for row in series:
+            labels, values = tuple(row['labels']), row['values']
+            if labels in merged:
+                merged[labels] = [a + b for a, b in zip(merged[labels], values)]
+            else:
+                merged[labels] = list(values)
+    return merged
+
+
+def escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_metric(lines: List[str], name: str, kind: str, description: str, value: float) -> None:
+    lines += [f'# HELP {name} {description}', f'# TYPE {name} {kind}', f'{name} {value}']
+
+
+def render_histogram(
+    lines: List[str], name: str, description: str, label_names: Sequence[str], buckets: Sequence[float], series: Series,
+) -> None:
+    lines += [f'# HELP {name} {description}', f'# TYPE {name} histogram']
+    for labels, values in sorted(series.items()):
+        label_text = ','.join(f'{label}="{escape(value)}"' for label, value in zip(label_names, labels))
+        cumulative = 0
+        for bound, count in zip([*buckets, '+Inf'], values):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{label_text}}} {values[-1]}')
+        lines.append(f'{name}_count{{{label_text}}} {cumulative}')
+
+
+class MetricsMiddleware:
+    """Records latency, response size and in-flight count of every HTTP request into the registry."""
+
+    def __init__(self, app: ASGIApp, registry: MetricsRegistry) -> None:
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        registry = self.registry
+        started = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_with_metrics(message: Message) -> None:
+            nonlocal status, size
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif message['type'] == 'http.response.body':
+                size += len(message.get('body', b''))
+            await send(message)
+
+        registry.in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            registry.in_flight -= 1
+            # router puts the matched route into the scope
+            route = scope.get('route')
+            registry.observe(
+                scope['method'], route.path_format if route is not None else UNMATCHED_ROUTE,
+                status, time.perf_counter() - started, size,
+            )
+
+
+metrics_registry = MetricsRegistry(METRICS['LATENCY_BUCKETS'], METRICS['MULTIPROCESS_DIR'], METRICS['FLUSH_INTERVAL'])
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get('/metrics', include_in_schema=False)
+async def metrics() -> Response:
+    return Response(metrics_registry.render(), media_type='text/plain; version=0.0.4')
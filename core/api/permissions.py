@@ -7,14 +7,14 @@ from api.deps import get_current_user
 from services.base import ModelType
 from services.enums import RolesEnum
 from db.database import get_db
-from models.user import User
+from schemas.user import UserSchema
 
 SelfBasePermission = TypeVar('SelfBasePermission', bound='BasePermission')
 
 
 class PermissionParams(TypedDict):
     id: Union[int, str, None]
-    current_user: User
+    current_user: UserSchema
     session: AsyncSession
 
 
@@ -31,7 +31,7 @@ class BasePermission:
     def __call__(
         self, 
         id: Union[str, int, None] = None,
-        current_user: User = Depends(get_current_user), 
+        current_user: UserSchema = Depends(get_current_user), 
         session: AsyncSession = Depends(get_db)
     ) -> Callable[[Type[SelfBasePermission], PermissionParams], None]:
         return self.validate_permission(id=id, current_user=current_user, session=session)
@@ -45,7 +45,7 @@ class UserPermission(BasePermission):
         super().__init__(scope, additional_model)
 
     def validate_permission(self, **kwargs: PermissionParams):
-        current_user: User = kwargs['current_user']
+        current_user: UserSchema = kwargs['current_user']
         if current_user.role.value != RolesEnum.USER.value:
             raise self.error
 
@@ -55,7 +55,7 @@ class AdminPermission(BasePermission):
         super().__init__(scope, additional_model)
 
     def validate_permission(self, **kwargs: PermissionParams):
-        current_user: User = kwargs['current_user']
+        current_user: UserSchema = kwargs['current_user']
         if current_user.role.value != RolesEnum.ADMIN.value:
             raise self.error
 
@@ -65,7 +65,7 @@ class UserAdminPermission(BasePermission):
         super().__init__(scope, additional_model)
 
     def validate_permission(self, **kwargs: PermissionParams):
-        current_user: User = kwargs['current_user']
+        current_user: UserSchema = kwargs['current_user']
         if current_user.role.value not in (RolesEnum.USER.value, RolesEnum.ADMIN.value):
             raise self.error
 
@@ -75,6 +75,6 @@ class UserOwnerPermission(BasePermission):
         super().__init__(scope, additional_model)
 
     def validate_permission(self, **kwargs: PermissionParams):
-        current_user: User = kwargs['current_user']
+        current_user: UserSchema = kwargs['current_user']
         if str(current_user.id) != kwargs['id']:
             raise self.error
@@ -0,0 +1,71 @@
+import json
+from typing import Any, AsyncIterator, Dict, List, Type
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from services.base import SchemaType
+from services.enums import StreamFormatEnum
+
+try:
+    import orjson
+except ImportError:  # optional, stdlib json is used without it
+    orjson = None
+
+STREAM_MEDIA_TYPES = {
+    StreamFormatEnum.JSON: 'application/json',
+    StreamFormatEnum.NDJSON: 'application/x-ndjson',
+}
+
+
+async def _json_array_chunks(chunks: AsyncIterator[List[Dict[str, Any]]], schema: Type[SchemaType]) -> AsyncIterator[str]:
+    yield '['
+    first = True
+    async for items in chunks:
+        body = ','.join(schema.parse_obj(item).json() for item in items)
+        if not body:
+            continue
+        yield body if first else ',' + body
+        first = False
+    yield ']'
+
+
+async def _ndjson_chunks(chunks: AsyncIterator[List[Dict[str, Any]]], schema: Type[SchemaType]) -> AsyncIterator[str]:
+    async for items in chunks:
+        yield ''.join(schema.parse_obj(item).json() + '\n' for item in items)
+
+
+def stream_response(
+    chunks: AsyncIterator[List[Dict[str, Any]]],
+    schema: Type[SchemaType],
+    stream_format: StreamFormatEnum = StreamFormatEnum.JSON,
+) -> StreamingResponse:
+    """Writes rows to the client chunk by chunk, as they come from the server-side cursor.
+
+    The whole result set is never held in memory, neither as rows nor as serialized body.
+    """
+    if stream_format == StreamFormatEnum.NDJSON:
+        content = _ndjson_chunks(chunks, schema)
+    else:
+        content = _json_array_chunks(chunks, schema)
+    return StreamingResponse(content, media_type=STREAM_MEDIA_TYPES[stream_format])
+
+
+def dumps(content: Any) -> bytes:
+    """Compact JSON bytes; types not known to the encoder (e.g. pydantic models) go through jsonable_encoder."""
+    if orjson is not None:
+        return orjson.dumps(content, default=jsonable_encoder)
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(',', ':'), default=jsonable_encoder,
+    ).encode('utf-8')
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded with orjson, when installed.
+
+    Returned directly from fast path endpoints (see BaseService.list_rows), it skips response_model
+    validation altogether, so content must already match the declared schema.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,49 @@
+import asyncio
+import functools
+from typing import Any, Callable, Coroutine, List
+
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.routing import APIRoute
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.database import finish_request_sessions, replicas, request_sessions, stick_to_primary
+
+
+class UnitOfWorkRoute(APIRoute):
+    """Route finishing database sessions of the request as soon as the endpoint returns.
+
+    By default, dependencies with yield are closed after the whole response is sent, so connection
+    stays checked out while response is serialized and written to a possibly slow client.
+    Here sessions are committed and connections returned to the pool before that,
+    commit errors are raised before any part of the response is sent as well.
+    With read replicas, responses to successful writes make following reads of the client stick to the primary.
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        endpoint = self.dependant.call
+        if asyncio.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def call(**values: Any) -> Any:
+                result = await endpoint(**values)
+                # streamed responses keep reading from the session, it is finished after they are sent
+                if not isinstance(result, StreamingResponse):
+                    await finish_request_sessions()
+                return result
+
+            self.dependant.call = call
+
+        handler = super().get_route_handler()
+
+        async def unit_of_work_handler(request: Request) -> Response:
+            sessions: List[AsyncSession] = []
+            token = request_sessions.set(sessions)
+            try:
+                response = await handler(request)
+            finally:
+                request_sessions.reset(token)
+            if replicas and response.status_code < 400 and any(not session.info.get('read_only') for session in sessions):
+                stick_to_primary(response)
+            return response
+
+        return unit_of_work_handler
@@ -0,0 +1,67 @@
+import json
+import logging
+import time
+from typing import Any, Dict
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from db.database import QueryStats, collect_query_stats
+
+logger = logging.getLogger(__name__)
+
+
+def server_timing(stats: QueryStats, seconds: float) -> str:
+    return (
+        f'db;dur={stats.db_seconds * 1000:.3f};desc="{stats.queries} queries", '
+        f'pool;dur={stats.pool_wait_seconds * 1000:.3f}, '
+        f'app;dur={seconds * 1000:.3f}'
+    )
+
+
+def request_record(scope: Scope, status: int, stats: QueryStats, seconds: float) -> Dict[str, Any]:
+    return {
+        'method': scope['method'],
+        'path': scope['path'],
+        'status': status,
+        'duration_ms': round(seconds * 1000, 3),
+        'queries': stats.queries,
+        'db_ms': round(stats.db_seconds * 1000, 3),
+        'pool_wait_ms': round(stats.pool_wait_seconds * 1000, 3),
+    }
+
+
+class ServerTimingMiddleware:
+    """Collects query stats of every request, sends them in Server-Timing header and logs them.
+
+    Header is sent with the start of the response, so queries of streamed responses
+    and background tasks are counted in the log only.
+    """
+
+    def __init__(self, app: ASGIApp, server_timing: bool = True, log_requests: bool = True) -> None:
+        self.app = app
+        self.server_timing = server_timing
+        self.log_requests = log_requests
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        with collect_query_stats() as stats:
+            async def send_with_timing(message: Message) -> None:
+                nonlocal status
+                if message['type'] == 'http.response.start':
+                    status = message['status']
+                    if self.server_timing:
+                        timing = server_timing(stats, time.perf_counter() - started)
+                        message['headers'] = [*message.get('headers', ()), (b'server-timing', timing.encode())]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                if self.log_requests:
+                    logger.info(json.dumps(request_record(scope, status, stats, time.perf_counter() - started)))
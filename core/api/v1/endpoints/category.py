@@ -1,24 +1,56 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, status, Response
+from fastapi import APIRouter, Depends, status, Response, Request
 from fastapi_utils.cbv import cbv
 
+from api.conditional import make_etag, not_modified_response, set_validators
+from api.deps import FieldsParams, PaginationParams
+from api.responses import FastJSONResponse
+from api.routing import UnitOfWorkRoute
+from schemas.bulk import BulkDeleteSchema, BulkResultSchema
+from schemas.pagination import PageSchema
 from schemas.post import PostCategoryCreateUpdateSchema, PostCategorySchema
 from services.post import PostCategoryService, get_category_service
 
-category_router = APIRouter()
+category_router = APIRouter(route_class=UnitOfWorkRoute)
 
 
 @cbv(category_router)
 class CategoryRouter:
     service: PostCategoryService = Depends(get_category_service)
     
-    @category_router.get('/', status_code=status.HTTP_200_OK, response_model=List[PostCategorySchema])
-    async def list(self):
-        return await self.service.list()
+    @category_router.get('/', status_code=status.HTTP_200_OK, response_model=PageSchema[PostCategorySchema])
+    async def list(
+        self,
+        request: Request,
+        pagination: PaginationParams = Depends(),
+        fields: Optional[List[str]] = Depends(FieldsParams(PostCategorySchema)),
+    ):
+        # categories are served from cache, so its version is known without DB I/O
+        etag = make_etag(await self.service.version(), fields)
+        not_modified = not_modified_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+        page = await self.service.list_rows(PostCategorySchema, cursor=pagination.cursor, limit=pagination.limit, fields=fields)
+        page['items'] = self.service.row_dicts(page['items'], PostCategorySchema, fields)
+        return FastJSONResponse(page, headers={'ETag': etag})
+
+    # bulk routes are declared before "/{id}" ones, otherwise "bulk" would be matched as id
+    @category_router.post('/bulk', status_code=status.HTTP_200_OK, response_model=BulkResultSchema[PostCategorySchema])
+    async def bulk_create(self, payload: List[PostCategoryCreateUpdateSchema]):
+        return await self.service.bulk_create(payload)
+
+    @category_router.delete('/bulk', status_code=status.HTTP_200_OK, response_model=BulkResultSchema[int])
+    async def bulk_delete(self, payload: BulkDeleteSchema):
+        return await self.service.bulk_delete(payload.ids)
 
     @category_router.get('/{id}', status_code=status.HTTP_200_OK, response_model=PostCategorySchema)
-    async def get(self, id: int):
+    async def get(self, id: int, request: Request, response: Response):
+        etag = make_etag(await self.service.version())
+        not_modified = not_modified_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+        set_validators(response, etag)
         return await self.service.get(id)
 
     @category_router.post('/', status_code=status.HTTP_201_CREATED, response_model=PostCategorySchema)
@@ -1,32 +1,161 @@
-from typing import List
-from unicodedata import category
+from typing import List, Optional, Tuple, Union
 
-from fastapi import APIRouter, Depends, status, Response
+from fastapi import APIRouter, Depends, status, Response, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.elements import BinaryExpression
 from models.post import Post
 
-from db.database import get_db
-from schemas.post import PostSchema, PostCreateUpdateSchema, PostUpdateValidatedSchema
-from services.post import PostService
+from api.conditional import is_conditional, make_etag, not_modified_response, set_validators
+from api.deps import FieldsParams, FilterParams, ListFilters, PaginationParams
+from api.responses import FastJSONResponse, dumps, stream_response
+from api.routing import UnitOfWorkRoute
+from db.database import get_db, get_streaming_db, primary_read_session
+from schemas.bulk import BulkDeleteSchema, BulkResultSchema
+from schemas.pagination import PageSchema
+from schemas.post import PostSchema, PostCreateUpdateSchema, PostUpdateValidatedSchema, PostBulkUpdateValidatedSchema
+from services.enums import StreamFormatEnum
+from services.post import PostService, PostSearchService, validated_feed_cache
 
-post_router = APIRouter()
+post_router = APIRouter(route_class=UnitOfWorkRoute)
 
+# when set, the whole result set is streamed from a server-side cursor of get_streaming_db session
+# and pagination is ignored
+stream_query = Query(None, description='Stream the whole result set as JSON array or NDJSON')
 
-@post_router.get('/', status_code=status.HTTP_200_OK, response_model=List[PostSchema])
-async def list(session: AsyncSession = Depends(get_db)):
-    return await PostService(session).list()
 
-@post_router.get('/validated', status_code=status.HTTP_200_OK, response_model=List[PostSchema])
-async def list_validated(session: AsyncSession = Depends(get_db)):
-    return await PostService(session).list_validated()
+# sparse fieldset of list items, large text is not even selected when not asked for
+fields_params = FieldsParams(PostSchema)
 
-@post_router.get('/unvalidated', status_code=status.HTTP_200_OK, response_model=List[PostSchema])
-async def list_unvalidated(session: AsyncSession = Depends(get_db)):
-    return await PostService(session).list_unvalidated()
+
+async def load_page(
+    service: PostService,
+    sub_stmt: Union[BinaryExpression, bool],
+    pagination: PaginationParams,
+    fields: Optional[List[str]],
+) -> Tuple[bytes, str]:
+    """Page of posts as JSON body, encoded without per-row validation, and its ETag."""
+    page = await service.list_rows(PostSchema, sub_stmt, pagination.cursor, pagination.limit, fields)
+    parts, _ = service.page_version(page['items'], page['next_cursor'] is not None)
+    page['items'] = service.row_dicts(page['items'], PostSchema, fields)
+    return dumps(page), make_etag(*parts, fields)
+
+
+async def conditional_page(
+    request: Request,
+    service: PostService,
+    sub_stmt: Union[BinaryExpression, bool],
+    pagination: PaginationParams,
+    fields: Optional[List[str]],
+) -> Response:
+    # conditional requests are answered from ids and modification times of the page only
+    if is_conditional(request):
+        parts, _ = await service.versions(sub_stmt, pagination.cursor, pagination.limit)
+        not_modified = not_modified_response(request, make_etag(*parts, fields))
+        if not_modified is not None:
+            return not_modified
+
+    body, etag = await load_page(service, sub_stmt, pagination, fields)
+    # no Last-Modified for lists, it does not change when a post is deleted from the page
+    return Response(content=body, media_type='application/json', headers={'ETag': etag})
+
+
+@post_router.get('/', status_code=status.HTTP_200_OK, response_model=PageSchema[PostSchema])
+async def list(
+    request: Request,
+    pagination: PaginationParams = Depends(),
+    filters: ListFilters = Depends(FilterParams(PostService)),
+    fields: Optional[List[str]] = Depends(fields_params),
+    stream: Optional[StreamFormatEnum] = stream_query,
+    session: AsyncSession = Depends(get_db),
+    streaming_session: AsyncSession = Depends(get_streaming_db),
+):
+    service = PostService(streaming_session if stream is not None else session)
+    service.set_order(filters.order)
+    sub_stmt = await service.filter_condition(filters.values)
+    if stream is not None:
+        return stream_response(service.stream(sub_stmt), PostSchema, stream)
+    return await conditional_page(request, service, sub_stmt, pagination, fields)
+
+@post_router.get('/validated', status_code=status.HTTP_200_OK, response_model=PageSchema[PostSchema])
+async def list_validated(
+    request: Request,
+    pagination: PaginationParams = Depends(),
+    fields: Optional[List[str]] = Depends(fields_params),
+    stream: Optional[StreamFormatEnum] = stream_query,
+    session: AsyncSession = Depends(get_db),
+    streaming_session: AsyncSession = Depends(get_streaming_db),
+):
+    if stream is not None:
+        return stream_response(PostService(streaming_session).stream_validated(), PostSchema, stream)
+
+    # hits skip both the query and serialization; misses are loaded from the primary, page outlives the request
+    key = f'{pagination.cursor}:{pagination.limit}:{fields}'
+    generation = await validated_feed_cache.generation()
+    cached = await validated_feed_cache.get(key, generation)
+    if cached is None:
+        async with primary_read_session(session) as fill_session:
+            body, etag = await load_page(PostService(fill_session), Post.validated == True, pagination, fields)
+        cached = {'body': body.decode(), 'etag': etag}
+        await validated_feed_cache.set(key, cached, generation)
+
+    not_modified = not_modified_response(request, cached['etag'])
+    if not_modified is not None:
+        return not_modified
+    return Response(content=cached['body'], media_type='application/json', headers={'ETag': cached['etag']})
+
+@post_router.get('/unvalidated', status_code=status.HTTP_200_OK, response_model=PageSchema[PostSchema])
+async def list_unvalidated(
+    request: Request,
+    pagination: PaginationParams = Depends(),
+    fields: Optional[List[str]] = Depends(fields_params),
+    stream: Optional[StreamFormatEnum] = stream_query,
+    session: AsyncSession = Depends(get_db),
+    streaming_session: AsyncSession = Depends(get_streaming_db),
+):
+    if stream is not None:
+        return stream_response(PostService(streaming_session).stream_unvalidated(), PostSchema, stream)
+    return await conditional_page(request, PostService(session), Post.validated == False, pagination, fields)
+
+@post_router.get('/search', status_code=status.HTTP_200_OK, response_model=PageSchema[PostSchema])
+async def search(
+    q: str = Query(..., min_length=1, max_length=256, description='Web search syntax, e.g. \'"connection pool" -sync\''),
+    category: Optional[str] = Query(None, description='Category title'),
+    validated: Optional[bool] = None,
+    pagination: PaginationParams = Depends(),
+    fields: Optional[List[str]] = Depends(fields_params),
+    session: AsyncSession = Depends(get_db),
+):
+    service = PostSearchService(session, q)
+    page = await service.search(PostSchema, category, validated, pagination.cursor, pagination.limit, fields)
+    page['items'] = service.row_dicts(page['items'], PostSchema, fields)
+    return FastJSONResponse(page)
+
+# bulk routes are declared before "/{id}" ones, otherwise "bulk" would be matched as id
+@post_router.post('/bulk', status_code=status.HTTP_200_OK, response_model=BulkResultSchema[PostSchema])
+async def bulk_create(payload: List[PostCreateUpdateSchema], session: AsyncSession = Depends(get_db)):
+    return await PostService(session).bulk_create(payload)
+
+@post_router.patch('/validated/bulk', status_code=status.HTTP_200_OK, response_model=BulkResultSchema[PostSchema])
+async def bulk_update_validated(payload: List[PostBulkUpdateValidatedSchema], session: AsyncSession = Depends(get_db)):
+    return await PostService(session).bulk_update(payload)
+
+@post_router.delete('/bulk', status_code=status.HTTP_200_OK, response_model=BulkResultSchema[int])
+async def bulk_delete(payload: BulkDeleteSchema, session: AsyncSession = Depends(get_db)):
+    return await PostService(session).bulk_delete(payload.ids)
 
 @post_router.get('/{id}', status_code=status.HTTP_200_OK, response_model=PostSchema)
-async def get(id: int, session: AsyncSession = Depends(get_db)):
-    return await PostService(session).get(id)
+async def get(id: int, request: Request, response: Response, session: AsyncSession = Depends(get_db)):
+    service = PostService(session)
+    if is_conditional(request):
+        parts, last_modified = await service.versions(Post.id == id, limit=1)
+        not_modified = not_modified_response(request, make_etag(*parts), last_modified)
+        if not_modified is not None:
+            return not_modified
+
+    post = await service.get(id)
+    parts, last_modified = service.page_version([post])
+    set_validators(response, make_etag(*parts), last_modified)
+    return post
 
 @post_router.put('/{id}/update_validated', status_code=status.HTTP_200_OK, response_model=PostSchema)
 async def update_validated(id: int, payload: PostUpdateValidatedSchema, session: AsyncSession = Depends(get_db)):
@@ -0,0 +1,20 @@
+from typing import Dict, Union
+
+from fastapi import APIRouter, Depends, status
+
+from api.permissions import AdminPermission
+from api.routing import UnitOfWorkRoute
+from db.database import pool_stats, replicas
+from services.hashing import password_hasher
+
+system_router = APIRouter(route_class=UnitOfWorkRoute)
+
+
+# per worker process, sizing of pools and thread pools is done from these
+@system_router.get('/stats', status_code=status.HTTP_200_OK, dependencies=[Depends(AdminPermission())])
+async def stats() -> Dict[str, Dict[str, Union[int, float]]]:
+    return {
+        'db_pool': pool_stats(),
+        'db_replicas': replicas.stats(),
+        'password_hasher': password_hasher.stats(),
+    }
@@ -1,22 +1,35 @@
-from typing import List
+from typing import List, Optional
 
 from fastapi import Depends, status, Response, APIRouter
 from fastapi_utils.cbv import cbv
 
+from api.deps import FieldsParams, FilterParams, ListFilters, PaginationParams
+from api.responses import FastJSONResponse
 from api.permissions import AdminPermission, UserAdminPermission, UserOwnerPermission
+from api.routing import UnitOfWorkRoute
+from schemas.pagination import PageSchema
 from schemas.user import UserLoginSchema, UserSchema, UserCreateSchema, UserUpdateSchema, Token
 from services.user import UserService, get_user_service
 
-user_router = APIRouter()
+user_router = APIRouter(route_class=UnitOfWorkRoute)
 
 
 @cbv(user_router)
 class UserRouter:
     service: UserService = Depends(get_user_service)
 
-    @user_router.get(path='/', status_code=status.HTTP_200_OK, response_model=List[UserSchema], dependencies=[Depends(UserAdminPermission())])
-    async def list(self):
-        return await self.service.list()
+    @user_router.get(path='/', status_code=status.HTTP_200_OK, response_model=PageSchema[UserSchema], dependencies=[Depends(UserAdminPermission())])
+    async def list(
+        self,
+        pagination: PaginationParams = Depends(),
+        filters: ListFilters = Depends(FilterParams(UserService)),
+        fields: Optional[List[str]] = Depends(FieldsParams(UserSchema)),
+    ):
+        self.service.set_order(filters.order)
+        sub_stmt = await self.service.filter_condition(filters.values)
+        page = await self.service.list_rows(UserSchema, sub_stmt, pagination.cursor, pagination.limit, fields)
+        page['items'] = self.service.row_dicts(page['items'], UserSchema, fields)
+        return FastJSONResponse(page)
 
     @user_router.get('/{id}', status_code=status.HTTP_200_OK, response_model=UserSchema, dependencies=[Depends(UserAdminPermission())])
     async def retrieve(self, id: int):
@@ -0,0 +1,223 @@
+"""Load benchmark of the API endpoints over a seeded database.
+
+Seeds the database from SQLALCHEMY_DATABASE_URL with users, categories and posts, then drives every
+scenario either in-process through ASGI transport (app and DB only, no network), or with --url over HTTP
+against a running server, from several load generating processes holding many connections each.
+Latency percentiles and throughput per scenario are written to JSON, so runs can be diffed across commits.
+Must be pointed at a disposable database, migrated to head. Requires httpx.
+
+Usage: python -m benchmarks.api [--url URL] [--requests N] [--concurrency N] [--processes N]
+                                [--users N] [--categories N] [--posts N] [--no-seed] [--output FILE]
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.seed import PASSWORD, seed
+from core.config import API_V1_PREFIX
+from db.database import async_session
+
+# logins are spread over that many seeded users, see --users
+LOGIN_USERS = 100
+
+# scenario gets client, number of the request and ids of existing posts
+Scenario = Callable[[httpx.AsyncClient, int, List[int]], Awaitable[httpx.Response]]
+
+
+async def list_posts(client: httpx.AsyncClient, n: int, ids: List[int]) -> httpx.Response:
+    return await client.get(f'{API_V1_PREFIX}/post/')
+
+
+async def validated_feed(client: httpx.AsyncClient, n: int, ids: List[int]) -> httpx.Response:
+    return await client.get(f'{API_V1_PREFIX}/post/validated')
+
+
+async def get_post(client: httpx.AsyncClient, n: int, ids: List[int]) -> httpx.Response:
+    return await client.get(f'{API_V1_PREFIX}/post/{random.choice(ids)}')
+
+
+async def create_post(client: httpx.AsyncClient, n: int, ids: List[int]) -> httpx.Response:
+    payload = {'title': f'benchmark post {n}', 'text': 'text ' * 50, 'category': 'category 0'}
+    return await client.post(f'{API_V1_PREFIX}/post/', json=payload)
+
+
+async def update_validated(client: httpx.AsyncClient, n: int, ids: List[int]) -> httpx.Response:
+    payload = {'validated': n % 2 == 0}
+    return await client.put(f'{API_V1_PREFIX}/post/{random.choice(ids)}/update_validated', json=payload)
+
+
+async def login(client: httpx.AsyncClient, n: int, ids: List[int]) -> httpx.Response:
+    # seeded users are numbered from 1
+    payload = {'email': f'user{n % LOGIN_USERS + 1}@example.com', 'password': PASSWORD}
+    return await client.post(f'{API_V1_PREFIX}/user/login', json=payload)
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    'list': list_posts,
+    'validated_feed': validated_feed,
+    'get': get_post,
+    'create': create_post,
+    'update_validated': update_validated,
+    'login': login,
+}
+
+
+def percentile(latencies: List[float], q: float) -> float:
+    # nearest-rank, latencies are sorted
+    index = max(int(round(q / 100 * len(latencies) + 0.5)) - 1, 0)
+    return latencies[min(index, len(latencies) - 1)]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50) * 1000, 3),
+            'p95': round(percentile(latencies, 95) * 1000, 3),
+            'p99': round(percentile(latencies, 99) * 1000, 3),
+            'mean': round(sum(latencies) / len(latencies) * 1000, 3),
+            'max': round(latencies[-1] * 1000, 3),
+        },
+    }
+
+
+async def drive(
+    client: httpx.AsyncClient, scenario: Scenario, requests: int, concurrency: int, ids: List[int], offset: int = 0,
+) -> Tuple[List[float], int]:
+    """Sends requests from concurrency workers, each one waits for its response before sending the next."""
+    counter = itertools.count(offset)
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker() -> None:
+        nonlocal errors
+        for n in counter:
+            if n >= offset + requests:
+                return
+            started = time.perf_counter()
+            response = await scenario(client, n, ids)
+            latencies.append(time.perf_counter() - started)
+            errors += response.status_code >= 400
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors
+
+
+async def post_ids(client: httpx.AsyncClient) -> List[int]:
+    response = await client.get(f'{API_V1_PREFIX}/post/', params={'fields': 'id', 'limit': 200})
+    response.raise_for_status()
+    return [item['id'] for item in response.json()['items']]
+
+
+def _drive_over_http(url: str, name: str, requests: int, concurrency: int, ids: List[int], offset: int) -> Tuple[List[float], int]:
+    async def run() -> Tuple[List[float], int]:
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+            return await drive(client, SCENARIOS[name], requests, concurrency, ids, offset)
+
+    return asyncio.run(run())
+
+
+async def run_over_http(args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    """Load is generated by separate processes, so the client side does not bound throughput of the server."""
+    async with httpx.AsyncClient(base_url=args.url) as client:
+        ids = await post_ids(client)
+
+    results = {}
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=args.processes) as executor:
+        for name in SCENARIOS:
+            await loop.run_in_executor(executor, _drive_over_http, args.url, name, max(args.requests // 10, 1), args.concurrency, ids, 0)
+            share = args.requests // args.processes
+            started = time.perf_counter()
+            parts = await asyncio.gather(*(
+                loop.run_in_executor(
+                    executor, _drive_over_http, args.url, name, share, args.concurrency, ids, (process + 1) * share,
+                )
+                for process in range(args.processes)
+            ))
+            elapsed = time.perf_counter() - started
+            results[name] = summarize([latency for part in parts for latency in part[0]], sum(part[1] for part in parts), elapsed)
+            print(name, results[name])
+    return results
+
+
+async def run_in_process(args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    from main import app
+
+    results = {}
+    # ASGI transport does not send lifespan events
+    await app.router.startup()
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://benchmark') as client:
+            ids = await post_ids(client)
+            for name, scenario in SCENARIOS.items():
+                # warm-up: pool connections, caches, prepared statements
+                await drive(client, scenario, max(args.requests // 10, 1), args.concurrency, ids)
+                started = time.perf_counter()
+                latencies, errors = await drive(client, scenario, args.requests, args.concurrency, ids, args.requests)
+                results[name] = summarize(latencies, errors, time.perf_counter() - started)
+                print(name, results[name])
+    finally:
+        await app.router.shutdown()
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main(args: argparse.Namespace) -> None:
+    if not args.no_seed:
+        async with async_session() as session:
+            await seed(session, args.posts, args.categories, args.users)
+
+    results = await (run_over_http(args) if args.url else run_in_process(args))
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'time': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'mode': 'http' if args.url else 'asgi',
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'processes': args.processes if args.url else 1,
+            'dataset': {'users': args.users, 'categories': args.categories, 'posts': args.posts, 'seeded': not args.no_seed},
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.api', description=__doc__.split('\n')[0])
+    parser.add_argument('--url', help='base URL of a running server, in-process ASGI transport is used without it')
+    parser.add_argument('--requests', type=int, default=2000, help='measured requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=20, help='concurrent connections per process')
+    parser.add_argument('--processes', type=int, default=4, help='load generating processes, with --url only')
+    parser.add_argument('--users', type=int, default=1000, help=f'at least {LOGIN_USERS}')
+    parser.add_argument('--categories', type=int, default=10)
+    parser.add_argument('--posts', type=int, default=100000)
+    parser.add_argument('--no-seed', action='store_true', help='run over the data already in the database')
+    parser.add_argument('--output', default='benchmark-results.json')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    asyncio.run(main(parse_args(sys.argv[1:])))
@@ -0,0 +1,51 @@
+"""Microbenchmark of per-request overhead of the instrumentation middlewares.
+
+Calls a bare ASGI app returning a small JSON body directly, without network and routing,
+with and without MetricsMiddleware and ServerTimingMiddleware in front of it.
+
+Usage: python -m benchmarks.middleware [iterations]
+"""
+import asyncio
+import sys
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from api.metrics import MetricsMiddleware, MetricsRegistry
+from api.timing import ServerTimingMiddleware
+from core.config import METRICS
+
+SCOPE = {'type': 'http', 'method': 'GET', 'path': '/api/v1/post/1', 'headers': []}
+
+
+async def app(scope: Scope, receive: Receive, send: Send) -> None:
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [(b'content-type', b'application/json')]})
+    await send({'type': 'http.response.body', 'body': b'{"id":1}'})
+
+
+async def receive() -> Message:
+    return {'type': 'http.request', 'body': b''}
+
+
+async def send(message: Message) -> None:
+    pass
+
+
+async def measure(asgi_app: ASGIApp, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await asgi_app(dict(SCOPE), receive, send)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def main(iterations: int) -> None:
+    bare_us = await measure(app, iterations)
+    metrics_us = await measure(MetricsMiddleware(app, MetricsRegistry(METRICS['LATENCY_BUCKETS'])), iterations)
+    timing_us = await measure(ServerTimingMiddleware(app, log_requests=False), iterations)
+    print(f'bare app:                       {bare_us:8.2f} us/request')
+    print(f'MetricsMiddleware overhead:     {metrics_us - bare_us:8.2f} us/request')
+    print(f'ServerTimingMiddleware overhead:{timing_us - bare_us:8.2f} us/request')
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000))
@@ -4,6 +4,37 @@ import os
 
 # DB Configuration
 DATABASE_URL = os.environ.get('SQLALCHEMY_DATABASE_URL')
+# direct connection to Postgres for LISTEN, when DATABASE_URL points to PgBouncer in transaction mode
+DATABASE_DIRECT_URL = os.environ.get('SQLALCHEMY_DIRECT_DATABASE_URL')
+
+# Connection Pool Configuration, per worker process
+DB_POOL = {
+    'SIZE': int(os.environ.get('DB_POOL_SIZE', 5)),
+    'MAX_OVERFLOW': int(os.environ.get('DB_POOL_MAX_OVERFLOW', 10)),
+    # seconds to wait for a free connection before failing the request
+    'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT_SECONDS', 10)),
+    # seconds after which connections are replaced, keep below server and proxy idle timeouts
+    'RECYCLE': int(os.environ.get('DB_POOL_RECYCLE_SECONDS', 1800)),
+    'PRE_PING': os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true',
+    # prepared statements cached per connection; disabled behind PgBouncer, connections there are shared
+    'STATEMENT_CACHE_SIZE': int(os.environ.get('DB_STATEMENT_CACHE_SIZE', 100)),
+    # milliseconds, 0 disables; behind PgBouncer it must be set on the role instead
+    'STATEMENT_TIMEOUT': int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000)),
+    'PGBOUNCER': os.environ.get('DB_PGBOUNCER', 'false').lower() == 'true',
+    # pool connections opened at worker startup instead of by its first requests
+    'WARM_UP': os.environ.get('DB_POOL_WARM_UP', 'true').lower() == 'true',
+    'ECHO': os.environ.get('DB_ECHO', 'false').lower() == 'true',
+}
+
+# Read Replicas Configuration, pools are sized after DB_POOL
+DB_REPLICAS = {
+    # comma separated, read-only requests are spread over them; unset sends everything to the primary
+    'URLS': [url for url in os.environ.get('SQLALCHEMY_REPLICA_DATABASE_URLS', '').split(',') if url],
+    'HEALTH_CHECK_INTERVAL': float(os.environ.get('DB_REPLICA_HEALTH_CHECK_INTERVAL_SECONDS', 5)),
+    'HEALTH_CHECK_TIMEOUT': float(os.environ.get('DB_REPLICA_HEALTH_CHECK_TIMEOUT_SECONDS', 2)),
+    # seconds reads of a client go to the primary after its write, keep above replication lag
+    'STICKY_SECONDS': int(os.environ.get('DB_REPLICA_STICKY_SECONDS', 5)),
+}
 
 API_V1_PREFIX = '/api/v1'
 
@@ -14,4 +45,74 @@ JOSE = {
 
     'ALGORITHM': 'HS256',
     'SECRET_KEY': os.environ.get('JWT_SECRET_KEY'),
-}
\ No newline at end of file
+    'VERIFIED_TOKENS_CACHE_SIZE': int(os.environ.get('VERIFIED_TOKENS_CACHE_SIZE', 10000)),
+}
+
+# Pagination Configuration
+PAGINATION = {
+    'DEFAULT_LIMIT': int(os.environ.get('PAGINATION_DEFAULT_LIMIT', 50)),
+    'MAX_LIMIT': int(os.environ.get('PAGINATION_MAX_LIMIT', 200)),
+}
+
+# Streaming Configuration
+STREAMING = {
+    # rows fetched from the server-side cursor and written to the client at once
+    'CHUNK_SIZE': int(os.environ.get('STREAMING_CHUNK_SIZE', 500)),
+}
+
+# Cache Configuration
+CACHE = {
+    # dotted path to services.cache.CacheBackend implementation, shared backends must accept same kwargs
+    'BACKEND': os.environ.get('CACHE_BACKEND', 'services.cache.InMemoryCache'),
+    'PRINCIPAL_TTL': float(os.environ.get('PRINCIPAL_CACHE_TTL_SECONDS', 30)),
+    'PRINCIPAL_MAX_SIZE': int(os.environ.get('PRINCIPAL_CACHE_MAX_SIZE', 10000)),
+    # in-process caches are kept coherent across workers by LISTEN/NOTIFY, TTLs bound staleness without it
+    'LISTEN': os.environ.get('CACHE_LISTEN', 'true').lower() == 'true',
+    'CATEGORY_TTL': float(os.environ.get('CATEGORY_CACHE_TTL_SECONDS', 60)),
+    'FEED_MAX_SIZE': int(os.environ.get('FEED_CACHE_MAX_SIZE', 1000)),
+    'FEED_TTL': float(os.environ.get('FEED_CACHE_TTL_SECONDS', 60)),
+}
+
+# Password Hashing Configuration
+HASHING = {
+    'MAX_WORKERS': int(os.environ.get('HASHING_MAX_WORKERS', os.cpu_count() or 1)),
+    # hashes submitted to the pool at once, the rest wait in queue
+    'MAX_CONCURRENCY': int(os.environ.get('HASHING_MAX_CONCURRENCY', 2 * (os.cpu_count() or 1))),
+}
+
+# Bulk Operations Configuration
+BULK = {
+    'MAX_ITEMS': int(os.environ.get('BULK_MAX_ITEMS', 1000)),
+}
+
+# Instrumentation Configuration
+INSTRUMENTATION = {
+    # query count, DB and pool wait time of the request in Server-Timing header
+    'SERVER_TIMING': os.environ.get('SERVER_TIMING', 'true').lower() == 'true',
+    # one JSON line per request to the api.timing logger
+    'LOG_REQUESTS': os.environ.get('LOG_REQUESTS', 'true').lower() == 'true',
+}
+
+# Metrics Configuration
+METRICS = {
+    'ENABLED': os.environ.get('METRICS_ENABLED', 'true').lower() == 'true',
+    # directory shared by worker processes of the server, emptied before it starts; unset for a single process
+    'MULTIPROCESS_DIR': os.environ.get('METRICS_MULTIPROCESS_DIR'),
+    # seconds, metrics of other workers are served that much behind
+    'FLUSH_INTERVAL': float(os.environ.get('METRICS_FLUSH_INTERVAL_SECONDS', 5)),
+    'LATENCY_BUCKETS': [
+        float(bucket) for bucket in
+        os.environ.get('METRICS_LATENCY_BUCKETS', '0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10').split(',')
+    ],
+}
+
+# Server Configuration, see server.py
+SERVER = {
+    'HOST': os.environ.get('SERVER_HOST', '0.0.0.0'),
+    'PORT': int(os.environ.get('SERVER_PORT', 8080)),
+    'WORKERS': int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1)),
+    # seconds in-flight requests get to finish on SIGTERM, keep below the container stop grace period
+    'DRAIN_TIMEOUT': float(os.environ.get('SERVER_DRAIN_TIMEOUT_SECONDS', 20)),
+    'KEEP_ALIVE': int(os.environ.get('SERVER_KEEP_ALIVE_SECONDS', 5)),
+    'MIGRATE': os.environ.get('SERVER_MIGRATE', 'true').lower() == 'true',
+}
@@ -1,25 +1,373 @@
-from typing import AsyncGenerator
-from click import echo
+import asyncio
+import itertools
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, Iterator, List, Optional, Union
 
+from fastapi import Request, Response
+from sqlalchemy import event, text
+from sqlalchemy.exc import DBAPIError, InvalidRequestError, TimeoutError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import ORMExecuteState, Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 
-from core.config import DATABASE_URL
+from core.config import DATABASE_URL, DATABASE_DIRECT_URL, DB_POOL, DB_REPLICAS
 
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+class PoolMetrics:
+    """Checkout counters of InstrumentedPool, with current state of the pool in stats()."""
+
+    def __init__(self) -> None:
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def observe(self, wait_seconds: float, timed_out: bool = False) -> None:
+        self.checkouts += 1
+        self.timeouts += timed_out
+        self.wait_seconds += wait_seconds
+        self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+    def stats(self, pool: AsyncAdaptedQueuePool) -> Dict[str, Union[int, float]]:
+        return {
+            'size': pool.size(),
+            'max_overflow': DB_POOL['MAX_OVERFLOW'],
+            'in_use': pool.checkedout(),
+            'idle': pool.checkedin(),
+            # connections opened above size, negative overflow() counts ones not opened yet
+            'overflow': max(pool.overflow(), 0),
+            'checkouts': self.checkouts,
+            'timeouts': self.timeouts,
+            'wait_seconds_total': self.wait_seconds,
+            'wait_seconds_max': self.max_wait_seconds,
+        }
+
+
+pool_metrics = PoolMetrics()
+
+
+class QueryStats:
+    """Queries run within a request, with time spent on them and on waiting for pool connections.
+
+    Stats opened within other stats, e.g. request within query_budget, are counted into both.
+    """
+
+    def __init__(self, parent: Optional['QueryStats'] = None) -> None:
+        self.parent = parent
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.pool_wait_seconds = 0.0
+
+    def observe_query(self, seconds: float) -> None:
+        stats: Optional[QueryStats] = self
+        while stats is not None:
+            stats.queries += 1
+            stats.db_seconds += seconds
+            stats = stats.parent
+
+    def observe_pool_wait(self, seconds: float) -> None:
+        stats: Optional[QueryStats] = self
+        while stats is not None:
+            stats.pool_wait_seconds += seconds
+            stats = stats.parent
+
+
+request_stats: ContextVar[Optional[QueryStats]] = ContextVar('request_stats', default=None)
+
+
+@contextmanager
+def collect_query_stats() -> Iterator[QueryStats]:
+    stats = QueryStats(request_stats.get())
+    token = request_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        request_stats.reset(token)
+
+
+@contextmanager
+def query_budget(max_queries: int) -> Iterator[QueryStats]:
+    """Fails with AssertionError when more than max_queries are run within the block, for use in tests.
+
+    E.g. requests sent straight to the app, see tests/test_query_budgets.py:
+        with query_budget(2):
+            run(client.request('GET', '/api/v1/post/1'))
+    """
+    with collect_query_stats() as stats:
+        yield stats
+    assert stats.queries <= max_queries, f'{stats.queries} queries run, budget is {max_queries}'
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool recording how long checkouts wait for a free connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except TimeoutError:
+            self._observe(time.perf_counter() - started, timed_out=True)
+            raise
+        self._observe(time.perf_counter() - started)
+        return connection
+
+    @staticmethod
+    def _observe(wait_seconds: float, timed_out: bool = False) -> None:
+        pool_metrics.observe(wait_seconds, timed_out)
+        stats = request_stats.get()
+        if stats is not None:
+            stats.observe_pool_wait(wait_seconds)
+
+
+def _start_query_timer(connection, cursor, statement, parameters, context, executemany) -> None:
+    if request_stats.get() is not None:
+        context.query_started = time.perf_counter()
+
+
+def _observe_query(connection, cursor, statement, parameters, context, executemany) -> None:
+    stats = request_stats.get()
+    # stats may be opened while the query runs
+    if stats is not None and hasattr(context, 'query_started'):
+        stats.observe_query(time.perf_counter() - context.query_started)
+
+
+def _observe_failed_query(exception_context) -> None:
+    context = exception_context.execution_context
+    stats = request_stats.get()
+    if stats is not None and hasattr(context, 'query_started'):
+        stats.observe_query(time.perf_counter() - context.query_started)
+
+
+def connect_args() -> Dict[str, Any]:
+    if DB_POOL['PGBOUNCER']:
+        # transaction mode hands every transaction a different server connection, so statements prepared
+        # on one are not known on another; startup parameters such as statement_timeout are rejected
+        return {'statement_cache_size': 0, 'prepared_statement_cache_size': 0}
+
+    args: Dict[str, Any] = {
+        'statement_cache_size': DB_POOL['STATEMENT_CACHE_SIZE'],
+        # SQLAlchemy keeps its own cache of asyncpg prepared statements on top
+        'prepared_statement_cache_size': DB_POOL['STATEMENT_CACHE_SIZE'],
+    }
+    if DB_POOL['STATEMENT_TIMEOUT']:
+        args['server_settings'] = {'statement_timeout': str(DB_POOL['STATEMENT_TIMEOUT'])}
+    return args
+
+
+def make_engine(url: str) -> AsyncEngine:
+    engine = create_async_engine(
+        url,
+        echo=DB_POOL['ECHO'],
+        poolclass=InstrumentedPool,
+        pool_size=DB_POOL['SIZE'],
+        max_overflow=DB_POOL['MAX_OVERFLOW'],
+        pool_timeout=DB_POOL['TIMEOUT'],
+        pool_recycle=DB_POOL['RECYCLE'],
+        pool_pre_ping=DB_POOL['PRE_PING'],
+        connect_args=connect_args(),
+    )
+    event.listen(engine.sync_engine, 'before_cursor_execute', _start_query_timer)
+    event.listen(engine.sync_engine, 'after_cursor_execute', _observe_query)
+    event.listen(engine.sync_engine, 'handle_error', _observe_failed_query)
+    return engine
+
+
+def make_read_only_session(engine: AsyncEngine, autocommit: bool = True) -> sessionmaker:
+    # autocommit: reads are sent without BEGIN and COMMIT round trips,
+    # server-side cursors of streamed reads need a transaction though
+    bind = engine.execution_options(isolation_level='AUTOCOMMIT') if autocommit else engine
+    return sessionmaker(bind, expire_on_commit=False, class_=AsyncSession, info={'read_only': True})
+
+
+engine = make_engine(DATABASE_URL)
+# LISTEN holds its connection for the whole process lifetime, so it can not go through PgBouncer
+listen_engine = create_async_engine(DATABASE_DIRECT_URL, poolclass=NullPool) if DATABASE_DIRECT_URL else engine
 async_session = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+read_only_session = make_read_only_session(engine)
+streaming_session = make_read_only_session(engine, autocommit=False)
 
-Base = declarative_base()
 
-async def get_db() -> AsyncGenerator:
-    async with async_session() as session:
+class ReplicaSet:
+    """Read replicas taking read-only sessions in turn, skipping the ones failing periodic health checks.
+
+    Sessions fall back to the primary when no replica is healthy.
+    """
+
+    def __init__(self, urls: List[str], health_check_interval: float, health_check_timeout: float) -> None:
+        self.engines = [make_engine(url) for url in urls]
+        self.sessions = [make_read_only_session(replica) for replica in self.engines]
+        self.streaming_sessions = [make_read_only_session(replica, autocommit=False) for replica in self.engines]
+        self.healthy = [True] * len(self.engines)
+        self.health_check_interval = health_check_interval
+        self.health_check_timeout = health_check_timeout
+        self._turn = itertools.count()
+        self._health_check_task: Optional[asyncio.Task] = None
+
+    def __bool__(self) -> bool:
+        return bool(self.engines)
+
+    def session(self, streaming: bool = False) -> AsyncSession:
+        sessions = self.streaming_sessions if streaming else self.sessions
+        healthy = [session for session, healthy in zip(sessions, self.healthy) if healthy]
+        if not healthy:
+            return streaming_session() if streaming else read_only_session()
+        return healthy[next(self._turn) % len(healthy)]()
+
+    async def _check(self, replica: AsyncEngine) -> bool:
         try:
-            yield session
+            async with replica.connect() as connection:
+                await asyncio.wait_for(connection.execute(text('SELECT 1')), self.health_check_timeout)
+        except (OSError, DBAPIError, TimeoutError, asyncio.TimeoutError):
+            return False
+        return True
+
+    async def check(self) -> None:
+        self.healthy = list(await asyncio.gather(*(self._check(replica) for replica in self.engines)))
+
+    async def _check_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            await self.check()
+
+    async def start(self) -> None:
+        if self and self._health_check_task is None:
+            await self.check()
+            self._health_check_task = asyncio.get_running_loop().create_task(self._check_periodically())
+
+    async def stop(self) -> None:
+        if self._health_check_task is not None:
+            self._health_check_task.cancel()
+            self._health_check_task = None
+        for replica in self.engines:
+            await replica.dispose()
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        return {'replicas': len(self.engines), 'healthy': sum(self.healthy)}
+
+
+replicas = ReplicaSet(DB_REPLICAS['URLS'], DB_REPLICAS['HEALTH_CHECK_INTERVAL'], DB_REPLICAS['HEALTH_CHECK_TIMEOUT'])
+
+# expiry time of read-your-writes stickiness of the client, set on responses to its writes
+PRIMARY_COOKIE = 'db_primary_until'
+
+
+def stick_to_primary(response: Response) -> None:
+    """Sends following reads of the client to the primary until replicas have likely replayed its write."""
+    expires = int(time.time()) + DB_REPLICAS['STICKY_SECONDS']
+    response.set_cookie(PRIMARY_COOKIE, str(expires), max_age=DB_REPLICAS['STICKY_SECONDS'], httponly=True)
+
+
+def sticks_to_primary(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+@asynccontextmanager
+async def primary_read_session(db_session: AsyncSession) -> AsyncIterator[AsyncSession]:
+    """Session to load data kept beyond the request, e.g. cache fills, from.
+
+    With replicas, read-only sessions may be on a lagging one, whose rows cached right after an invalidation
+    would stay stale until the next one; those are read on the primary instead. Other sessions are used
+    as they are, so writes see their own changes.
+    """
+    if replicas and db_session.info.get('read_only'):
+        async with read_only_session() as primary_session:
+            yield primary_session
+    else:
+        yield db_session
+
+Base = declarative_base()
+
+
+async def warm_up(pool_engine: AsyncEngine, connections: int) -> None:
+    """Opens connections of the pool up front, so first requests of the worker do not wait for connecting."""
+    async def connect() -> None:
+        async with pool_engine.connect() as connection:
+            await connection.execute(text('SELECT 1'))
+
+    # checked out at once, so every one is a new connection
+    await asyncio.gather(*(connect() for _ in range(connections)))
+
+
+def pool_stats() -> Dict[str, Union[int, float]]:
+    return pool_metrics.stats(engine.sync_engine.pool)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _reject_read_only_statements(orm_execute_state: ORMExecuteState) -> None:
+    if orm_execute_state.session.info.get('read_only') and not orm_execute_state.is_select:
+        raise InvalidRequestError('Writes are not allowed within read-only session!')
+
+
+@event.listens_for(Session, 'before_flush')
+def _reject_read_only_flush(session: Session, flush_context, instances) -> None:
+    if session.info.get('read_only') and (session.new or session.dirty or session.deleted):
+        raise InvalidRequestError('Writes are not allowed within read-only session!')
+
+
+# sessions opened by get_db within the current request, see api.routing.UnitOfWorkRoute
+request_sessions: ContextVar[Optional[List[AsyncSession]]] = ContextVar('request_sessions', default=None)
+
+
+async def finish(session: AsyncSession) -> None:
+    """Commits the session and returns its connection to the pool, repeated calls do nothing."""
+    if session.info.get('finished'):
+        return
+    session.info['finished'] = True
+    try:
+        if session.in_transaction():
             await session.commit()
-        except Exception as err:
-            await session.rollback()
-            raise err
-        finally:
-            await session.close()
+    finally:
+        await session.close()
+
+
+async def finish_request_sessions() -> None:
+    for session in request_sessions.get() or ():
+        await finish(session)
+
+
+def _read_session(request: Request, streaming: bool = False) -> AsyncSession:
+    if replicas and not sticks_to_primary(request):
+        return replicas.session(streaming)
+    return streaming_session() if streaming else read_only_session()
+
+
+@asynccontextmanager
+async def _request_session(session: AsyncSession) -> AsyncIterator[AsyncSession]:
+    sessions = request_sessions.get()
+    if sessions is not None:
+        sessions.append(session)
+    try:
+        yield session
+        await finish(session)
+    except Exception as err:
+        await session.rollback()
+        raise err
+    finally:
+        await session.close()
+
+
+async def get_db(request: Request) -> AsyncGenerator:
+    """Session of the request, connection is checked out on the first query only.
+
+    Sessions of GET and HEAD requests are read-only, opened on a replica when there are any,
+    unless the client has written recently. Under UnitOfWorkRoute session is finished as soon as
+    the endpoint returns, otherwise after the response is sent.
+    """
+    session = async_session() if request.method not in ('GET', 'HEAD') else _read_session(request)
+    async with _request_session(session) as request_session:
+        yield request_session
+
+
+async def get_streaming_db(request: Request) -> AsyncGenerator:
+    """Read-only session of endpoints streaming from server-side cursors, which need a transaction.
+
+    Endpoints streaming only on request take it besides get_db one, neither checks out a connection unless used.
+    """
+    async with _request_session(_read_session(request, streaming=True)) as request_session:
+        yield request_session
@@ -0,0 +1,90 @@
+import asyncio
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import select, func
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from db.database import listen_engine
+
+# called with notification payload, or with None when notifications may have been missed
+NotificationCallback = Callable[[Optional[str]], None]
+
+
+class NotificationListener:
+    """Postgres LISTEN on a single pooled connection per worker, dispatching notifications by channel.
+
+    Used to keep in-process caches coherent across workers: NOTIFY issued within a transaction
+    is delivered to every listener, including the sender, once the transaction is committed.
+    """
+
+    def __init__(self, reconnect_delay: float = 1.0, max_reconnect_delay: float = 30.0) -> None:
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self._callbacks: Dict[str, List[NotificationCallback]] = {}
+        self._connection: Optional[AsyncConnection] = None
+        self._driver_connection = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+
+    @property
+    def listening(self) -> bool:
+        return self._connection is not None
+
+    def subscribe(self, channel: str, callback: NotificationCallback) -> None:
+        self._callbacks.setdefault(channel, []).append(callback)
+
+    async def notify(self, db_session: AsyncSession, channel: str, payload: str = '') -> None:
+        await db_session.execute(select(func.pg_notify(channel, payload)))
+
+    def _on_notification(self, connection, pid, channel, payload) -> None:
+        for callback in self._callbacks.get(channel, []):
+            callback(payload)
+
+    def _on_termination(self, connection) -> None:
+        self._connection = None
+        # notifications may be missed until reconnect
+        for callbacks in self._callbacks.values():
+            for callback in callbacks:
+                callback(None)
+        self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def start(self) -> None:
+        if self.listening or not self._callbacks:
+            return
+
+        connection = await listen_engine.connect()
+        driver_connection = (await connection.get_raw_connection()).driver_connection
+        for channel in self._callbacks:
+            await driver_connection.add_listener(channel, self._on_notification)
+        driver_connection.add_termination_listener(self._on_termination)
+        self._connection, self._driver_connection = connection, driver_connection
+
+        # changes made before LISTEN was issued are not notified
+        for callbacks in self._callbacks.values():
+            for callback in callbacks:
+                callback(None)
+
+    async def _reconnect(self) -> None:
+        delay = self.reconnect_delay
+        while not self.listening:
+            await asyncio.sleep(delay)
+            try:
+                await self.start()
+            except (OSError, DBAPIError):
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def stop(self) -> None:
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+        if self._connection is None:
+            return
+
+        connection, self._connection = self._connection, None
+        # connection goes back to the pool, so it must not keep listening
+        self._driver_connection.remove_termination_listener(self._on_termination)
+        for channel in self._callbacks:
+            await self._driver_connection.remove_listener(channel, self._on_notification)
+        await connection.close()
+
+
+notification_listener = NotificationListener()
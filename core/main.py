@@ -1,7 +1,17 @@
+import asyncio
+import logging
+
 from fastapi import FastAPI
+from sqlalchemy.exc import DBAPIError
 
+from api.metrics import MetricsMiddleware, metrics_registry, metrics_router
+from api.responses import FastJSONResponse
+from api.timing import ServerTimingMiddleware, logger as timing_logger
 from api.v1.api import api_router
-from core.config import API_V1_PREFIX
+from core.config import API_V1_PREFIX, CACHE, DATABASE_DIRECT_URL, DB_POOL, INSTRUMENTATION, METRICS
+from db.database import engine, replicas, warm_up
+from db.notifications import notification_listener
+from services.hashing import password_hasher
 
 app = FastAPI(
     title='Forum Async API',
@@ -9,6 +19,73 @@ app = FastAPI(
     version='1.0.0',
     docs_url='/api/openapi',
     openapi_url='/api/openapi.json',
+    default_response_class=FastJSONResponse,
 )
 
 app.include_router(api_router, prefix=API_V1_PREFIX)
+
+if INSTRUMENTATION['SERVER_TIMING'] or INSTRUMENTATION['LOG_REQUESTS']:
+    app.add_middleware(
+        ServerTimingMiddleware,
+        server_timing=INSTRUMENTATION['SERVER_TIMING'],
+        log_requests=INSTRUMENTATION['LOG_REQUESTS'],
+    )
+    # only own handler, INFO on the root logger would turn on SQLAlchemy logging as well
+    if INSTRUMENTATION['LOG_REQUESTS'] and not timing_logger.handlers:
+        timing_logger.addHandler(logging.StreamHandler())
+        timing_logger.setLevel(logging.INFO)
+
+if METRICS['ENABLED']:
+    app.include_router(metrics_router)
+    # added last, so latency includes the other middlewares
+    app.add_middleware(MetricsMiddleware, registry=metrics_registry)
+
+
+@app.on_event('startup')
+async def start_notification_listener() -> None:
+    # without direct connection, caches fall back to TTLs behind PgBouncer
+    if CACHE['LISTEN'] and (DATABASE_DIRECT_URL or not DB_POOL['PGBOUNCER']):
+        await notification_listener.start()
+
+
+@app.on_event('startup')
+async def start_replica_health_checks() -> None:
+    await replicas.start()
+
+
+@app.on_event('startup')
+async def warm_up_pools() -> None:
+    if not DB_POOL['WARM_UP']:
+        return
+    healthy_replicas = [replica for replica, healthy in zip(replicas.engines, replicas.healthy) if healthy]
+    try:
+        await asyncio.gather(*(warm_up(pool_engine, DB_POOL['SIZE']) for pool_engine in [engine, *healthy_replicas]))
+    except (OSError, DBAPIError) as err:
+        # worker still starts, connections are opened by requests once the database is back
+        logging.getLogger('uvicorn.error').warning('Connection pool warm-up failed: %s', err)
+
+
+@app.on_event('startup')
+async def start_metrics() -> None:
+    if METRICS['ENABLED']:
+        await metrics_registry.start()
+
+
+@app.on_event('shutdown')
+async def stop_notification_listener() -> None:
+    await notification_listener.stop()
+
+
+@app.on_event('shutdown')
+async def stop_replicas() -> None:
+    await replicas.stop()
+
+
+@app.on_event('shutdown')
+async def stop_metrics() -> None:
+    await metrics_registry.stop()
+
+
+@app.on_event('shutdown')
+def shutdown_password_hasher() -> None:
+    password_hasher.shutdown()
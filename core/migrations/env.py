@@ -4,6 +4,7 @@ from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncEngine
 
 from alembic import context
@@ -25,7 +26,14 @@ if config.config_file_name is not None:
 # target_metadata = mymodel.Base.metadata
 target_metadata = metadata
 
-config.set_main_option('sqlalchemy.url', os.environ.get('SQLALCHEMY_DATABASE_URL'))
+# session level advisory locks do not work through PgBouncer in transaction mode
+config.set_main_option(
+    'sqlalchemy.url',
+    os.environ.get('SQLALCHEMY_DIRECT_DATABASE_URL') or os.environ.get('SQLALCHEMY_DATABASE_URL'),
+)
+
+# held while migrating, instances starting at once wait for the first one and find nothing left to do
+MIGRATIONS_LOCK_KEY = 8240312587
 
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
@@ -81,7 +89,14 @@ async def run_migrations_online():
     )
 
     async with connectable.connect() as connection:
-        await connection.run_sync(do_run_migrations)
+        await connection.execute(text('SELECT pg_advisory_lock(:key)'), {'key': MIGRATIONS_LOCK_KEY})
+        # lock is held by the session, migrations begin their own transactions
+        await connection.commit()
+        try:
+            await connection.run_sync(do_run_migrations)
+        finally:
+            await connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': MIGRATIONS_LOCK_KEY})
+            await connection.commit()
 
     await connectable.dispose()
 
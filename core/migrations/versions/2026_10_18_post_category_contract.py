@@ -0,0 +1,57 @@
+"""post category contract
+
+Drops posts.category, kept by c6de22b02158 for app instances of the previous revision.
+Revisions of the contract branch are not applied on server start, see server.py; apply them
+once no instance of the previous revision runs: alembic upgrade contract@head
+
+Revision ID: 3f0d9c2b7e41
+Revises: c6de22b02158
+Create Date: 2026-10-18 18:40:05.224519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f0d9c2b7e41'
+down_revision = 'c6de22b02158'
+branch_labels = ('contract',)
+depends_on = None
+
+
+# same as in c6de22b02158, restored on downgrade
+CREATE_SYNC_FUNCTION = """
+CREATE FUNCTION posts_sync_category() RETURNS trigger AS $$
+BEGIN
+    IF NEW.category_id IS NULL OR (TG_OP = 'UPDATE' AND NEW.category IS DISTINCT FROM OLD.category) THEN
+        SELECT id INTO NEW.category_id FROM post_categories WHERE title = NEW.category;
+    ELSIF NEW.category IS NULL OR (TG_OP = 'UPDATE' AND NEW.category_id IS DISTINCT FROM OLD.category_id) THEN
+        SELECT title INTO NEW.category FROM post_categories WHERE id = NEW.category_id;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+"""
+CREATE_SYNC_TRIGGER = """
+CREATE TRIGGER posts_sync_category BEFORE INSERT OR UPDATE OF category, category_id ON posts
+FOR EACH ROW EXECUTE PROCEDURE posts_sync_category()
+"""
+
+
+def upgrade():
+    op.execute('DROP TRIGGER IF EXISTS posts_sync_category ON posts')
+    op.execute('DROP FUNCTION IF EXISTS posts_sync_category()')
+    # drops its foreign key to post_categories.title and ix_posts_category as well
+    op.drop_column('posts', 'category')
+
+
+def downgrade():
+    op.add_column('posts', sa.Column('category', sa.String(), nullable=True))
+    op.execute(
+        'UPDATE posts SET category = post_categories.title FROM post_categories WHERE posts.category_id = post_categories.id'
+    )
+    op.create_foreign_key('posts_category_fkey', 'posts', 'post_categories', ['category'], ['title'], onupdate='CASCADE')
+    op.create_index('ix_posts_category', 'posts', ['category'], unique=False)
+    op.execute(CREATE_SYNC_FUNCTION)
+    op.execute(CREATE_SYNC_TRIGGER)
@@ -0,0 +1,115 @@
+"""post category_id
+
+Revision ID: c6de22b02158
+Revises: 5d2b2d7c2f9b
+Create Date: 2026-10-18 12:03:17.902113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6de22b02158'
+down_revision = '5d2b2d7c2f9b'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 10000
+
+# app instances of both revisions run side by side until the contract revision, see 2026_10_18_post_category_contract.py:
+# posts written by title get their category_id, posts written by category_id get their title
+CREATE_SYNC_FUNCTION = """
+CREATE FUNCTION posts_sync_category() RETURNS trigger AS $$
+BEGIN
+    IF NEW.category_id IS NULL OR (TG_OP = 'UPDATE' AND NEW.category IS DISTINCT FROM OLD.category) THEN
+        SELECT id INTO NEW.category_id FROM post_categories WHERE title = NEW.category;
+    ELSIF NEW.category IS NULL OR (TG_OP = 'UPDATE' AND NEW.category_id IS DISTINCT FROM OLD.category_id) THEN
+        SELECT title INTO NEW.category FROM post_categories WHERE id = NEW.category_id;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+"""
+CREATE_SYNC_TRIGGER = """
+CREATE TRIGGER posts_sync_category BEFORE INSERT OR UPDATE OF category, category_id ON posts
+FOR EACH ROW EXECUTE PROCEDURE posts_sync_category()
+"""
+# asyncpg prepares every statement, so each one goes in its own execute
+DROP_SYNC_TRIGGER = 'DROP TRIGGER IF EXISTS posts_sync_category ON posts'
+DROP_SYNC_FUNCTION = 'DROP FUNCTION IF EXISTS posts_sync_category()'
+
+
+def backfill(stmt, remaining_condition):
+    """Runs UPDATE over consecutive id ranges, every range is committed on its own.
+
+    Row locks are held for a single batch only, and rerun after failure continues from the
+    first row that is still not backfilled.
+    """
+    connection = op.get_bind()
+    # outside of the migration transaction, which may hold an exclusive lock on posts
+    with op.get_context().autocommit_block():
+        start, end = connection.execute(
+            sa.text(f'SELECT min(id), max(id) FROM posts WHERE {remaining_condition}')
+        ).first()
+        if start is None:
+            return
+        for batch_start in range(start, end + 1, BATCH_SIZE):
+            connection.execute(sa.text(stmt), {'start': batch_start, 'end': batch_start + BATCH_SIZE})
+
+
+def upgrade():
+    # expand: posts.category stays, instances of the previous revision keep writing it
+    op.add_column('posts', sa.Column('category_id', sa.Integer(), nullable=True))
+    op.alter_column('posts', 'category', nullable=True)
+    op.execute(CREATE_SYNC_FUNCTION)
+    op.execute(CREATE_SYNC_TRIGGER)
+    # category renames through category_id must not be blocked by posts.category, the rename is cascaded
+    # to it instead, so instances of the previous revision still see the current title
+    op.drop_constraint('posts_category_fkey', 'posts', type_='foreignkey')
+    op.create_foreign_key(
+        'posts_category_fkey', 'posts', 'post_categories', ['category'], ['title'],
+        onupdate='CASCADE', postgresql_not_valid=True,
+    )
+
+    backfill(
+        """
+        UPDATE posts SET category_id = post_categories.id
+        FROM post_categories
+        WHERE posts.category = post_categories.title
+            AND posts.id >= :start AND posts.id < :end AND posts.category_id IS NULL
+        """,
+        'category_id IS NULL',
+    )
+
+    # NOT VALID constraints are added without scanning posts and committed right away;
+    # validation runs in its own transaction, under a lock that blocks neither reads nor writes
+    op.create_foreign_key(
+        'posts_category_id_fkey', 'posts', 'post_categories', ['category_id'], ['id'], postgresql_not_valid=True,
+    )
+    with op.get_context().autocommit_block():
+        op.execute('ALTER TABLE posts VALIDATE CONSTRAINT posts_category_fkey')
+        op.execute('ALTER TABLE posts VALIDATE CONSTRAINT posts_category_id_fkey')
+
+    # validated check lets SET NOT NULL skip the full table scan under exclusive lock
+    op.create_check_constraint(
+        'posts_category_id_not_null', 'posts', 'category_id IS NOT NULL', postgresql_not_valid=True,
+    )
+    with op.get_context().autocommit_block():
+        op.execute('ALTER TABLE posts VALIDATE CONSTRAINT posts_category_id_not_null')
+    op.alter_column('posts', 'category_id', nullable=False)
+    op.drop_constraint('posts_category_id_not_null', 'posts', type_='check')
+
+    with op.get_context().autocommit_block():
+        op.create_index('ix_posts_category_id', 'posts', ['category_id'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    op.execute(DROP_SYNC_TRIGGER)
+    op.execute(DROP_SYNC_FUNCTION)
+    op.alter_column('posts', 'category', nullable=False)
+    op.drop_constraint('posts_category_fkey', 'posts', type_='foreignkey')
+    op.create_foreign_key('posts_category_fkey', 'posts', 'post_categories', ['category'], ['title'])
+
+    op.drop_index('ix_posts_category_id', table_name='posts')
+    op.drop_column('posts', 'category_id')
@@ -0,0 +1,34 @@
+"""post filter indexes
+
+Revision ID: a4fe277b8245
+Revises: 9a7845fff3fb
+Create Date: 2026-10-18 16:40:52.105377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4fe277b8245'
+down_revision = '9a7845fff3fb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CONCURRENTLY does not lock posts for writes, but can not run inside transaction
+    with op.get_context().autocommit_block():
+        # posts of a category in keyset order of PostService, see PostService.filters;
+        # leading category_id keeps serving foreign key lookups
+        op.create_index(
+            'ix_posts_category_id_time_created_id', 'posts', ['category_id', 'time_created', 'id'], unique=False,
+            postgresql_concurrently=True,
+        )
+        op.drop_index('ix_posts_category_id', table_name='posts', postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_posts_category_id', 'posts', ['category_id'], unique=False, postgresql_concurrently=True)
+        op.drop_index('ix_posts_category_id_time_created_id', table_name='posts', postgresql_concurrently=True)
@@ -0,0 +1,49 @@
+"""post list indexes
+
+Revision ID: 5d2b2d7c2f9b
+Revises: ca5833512df8
+Create Date: 2026-10-18 10:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2b2d7c2f9b'
+down_revision = 'ca5833512df8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CONCURRENTLY does not lock posts for writes, but can not run inside transaction
+    with op.get_context().autocommit_block():
+        # keyset pagination order of PostService, see BaseService.list
+        op.create_index('ix_posts_time_created_id', 'posts', ['time_created', 'id'], unique=False, postgresql_concurrently=True)
+        op.create_index(
+            'ix_posts_validated_time_created_id', 'posts', ['time_created', 'id'], unique=False,
+            postgresql_where=sa.text('validated'), postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_posts_unvalidated_time_created_id', 'posts', ['time_created', 'id'], unique=False,
+            postgresql_where=sa.text('NOT validated'), postgresql_concurrently=True,
+        )
+        # foreign keys are not indexed by Postgres, category deletes and per-category scans need it
+        op.create_index('ix_posts_category', 'posts', ['category'], unique=False, postgresql_concurrently=True)
+
+    # duplicates of primary key indexes
+    op.drop_index('ix_posts_id', table_name='posts')
+    op.drop_index('ix_post_categories_id', table_name='post_categories')
+    op.drop_index('ix_users_id', table_name='users')
+
+
+def downgrade():
+    op.create_index('ix_users_id', 'users', ['id'], unique=False)
+    op.create_index('ix_post_categories_id', 'post_categories', ['id'], unique=False)
+    op.create_index('ix_posts_id', 'posts', ['id'], unique=False)
+
+    op.drop_index('ix_posts_category', table_name='posts')
+    op.drop_index('ix_posts_unvalidated_time_created_id', table_name='posts')
+    op.drop_index('ix_posts_validated_time_created_id', table_name='posts')
+    op.drop_index('ix_posts_time_created_id', table_name='posts')
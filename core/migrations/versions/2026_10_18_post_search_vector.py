@@ -0,0 +1,79 @@
+"""post search vector
+
+Column is maintained by trigger rather than being a stored generated one: adding that rewrites
+posts under exclusive lock, while nullable column without default is added at once, and existing
+rows are backfilled in batches, each committed on its own.
+
+Revision ID: 9a7845fff3fb
+Revises: c6de22b02158
+Create Date: 2026-10-18 15:21:06.472930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '9a7845fff3fb'
+down_revision = 'c6de22b02158'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 10000
+
+# text search configuration must be the one of models.post.SEARCH_CONFIG
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce({row}title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce({row}text, '')), 'B')"
+)
+CREATE_FUNCTION = f"""
+CREATE FUNCTION posts_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {SEARCH_VECTOR.format(row='NEW.')};
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+"""
+CREATE_TRIGGER = """
+CREATE TRIGGER posts_search_vector BEFORE INSERT OR UPDATE OF title, text ON posts
+FOR EACH ROW EXECUTE PROCEDURE posts_search_vector()
+"""
+
+
+def backfill():
+    """Fills search_vector of rows inserted before the trigger, over consecutive id ranges committed one by one."""
+    connection = op.get_bind()
+    with op.get_context().autocommit_block():
+        start, end = connection.execute(sa.text('SELECT min(id), max(id) FROM posts WHERE search_vector IS NULL')).first()
+        if start is None:
+            return
+        for batch_start in range(start, end + 1, BATCH_SIZE):
+            connection.execute(
+                sa.text(
+                    f'UPDATE posts SET search_vector = {SEARCH_VECTOR.format(row="")} '
+                    'WHERE id >= :start AND id < :end AND search_vector IS NULL'
+                ),
+                {'start': batch_start, 'end': batch_start + BATCH_SIZE},
+            )
+
+
+def upgrade():
+    op.add_column('posts', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+    # rows written from now on get it from the trigger, so backfill only sees the older ones
+    op.execute(CREATE_FUNCTION)
+    op.execute(CREATE_TRIGGER)
+    backfill()
+    # CONCURRENTLY does not lock posts for writes, but can not run inside transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_posts_search_vector', 'posts', ['search_vector'], unique=False,
+            postgresql_using='gin', postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    op.drop_index('ix_posts_search_vector', table_name='posts')
+    op.execute('DROP TRIGGER posts_search_vector ON posts')
+    op.execute('DROP FUNCTION posts_search_vector()')
+    op.drop_column('posts', 'search_vector')
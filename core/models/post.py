@@ -1,14 +1,20 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Boolean, TIMESTAMP
-from sqlalchemy.orm import relationship
+from typing import Optional
+
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Boolean, TIMESTAMP, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 
 from db.database import Base
 
+# text search configuration of Post.search_vector (set by its trigger), queries are parsed with the same one
+SEARCH_CONFIG = 'english'
+
 
 class PostCategory(Base):
     __tablename__ = 'post_categories'
 
-    id = Column(Integer, primary_key=True, autoincrement='auto', index=True)
+    id = Column(Integer, primary_key=True, autoincrement='auto')
     title = Column(String(25), nullable=False, unique=True)
     description = Column(String(100))
     posts = relationship('Post')
@@ -20,14 +26,28 @@ class PostCategory(Base):
 class Post(Base):
     __tablename__ = 'posts'
 
-    id = Column(Integer, primary_key=True, autoincrement='auto', index=True)
+    id = Column(Integer, primary_key=True, autoincrement='auto')
     title = Column(String(100), nullable=False)
     text = Column(Text)
     time_created = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     time_updated = Column(DateTime(timezone=True), onupdate=func.now())
-    category = Column(String, ForeignKey('post_categories.title'), nullable=False)
+    category_id = Column(Integer, ForeignKey('post_categories.id'), nullable=False)
     validated = Column(Boolean, server_default='false')
+    # title of the category, not stored with posts; set by PostService on load
+    category: Optional[str] = None
+    # maintained by trigger posts_search_vector (see its migration), matches in title rank above matches in text;
+    # deferred, so that neither entities nor rows selected by services carry it
+    search_vector = deferred(Column(TSVECTOR))
     
+    __table_args__ = (
+        # keyset pagination order of PostService, partial ones serve list_validated / list_unvalidated
+        Index('ix_posts_time_created_id', 'time_created', 'id'),
+        Index('ix_posts_validated_time_created_id', 'time_created', 'id', postgresql_where=validated),
+        Index('ix_posts_unvalidated_time_created_id', 'time_created', 'id', postgresql_where=~validated),
+        # also serves foreign key lookups, e.g. on category deletes
+        Index('ix_posts_category_id_time_created_id', 'category_id', 'time_created', 'id'),
+        Index('ix_posts_search_vector', 'search_vector', postgresql_using='gin'),
+    )
     __mapper_args__ = {"eager_defaults": True}
 
     def __repr__(self):
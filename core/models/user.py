@@ -1,15 +1,15 @@
-from passlib.hash import pbkdf2_sha256
 from sqlalchemy import Column, Integer, String, DateTime, Boolean, Enum
 from sqlalchemy.sql import func
 
 from db.database import Base
 from services.enums import RolesEnum
+from services.hashing import password_hasher
 
 
 class User(Base):
     __tablename__ = 'users'
 
-    id = Column(Integer, primary_key=True, autoincrement='auto', index=True)
+    id = Column(Integer, primary_key=True, autoincrement='auto')
     username = Column(String(50), nullable=False, unique=True)
     email = Column(String(50), nullable=False, unique=True)
     password = Column(String(128), nullable=False)
@@ -24,13 +24,14 @@ class User(Base):
     
     __mapper_args__ = {"eager_defaults": True}
 
+    # password is expected to be hashed already, see UserService.create
     def __init__(self, username, password, email) -> None:
         self.username = username
         self.email = email
-        self.password = pbkdf2_sha256.encrypt(password)
+        self.password = password
 
-    def verify_password(self, password: str) -> bool:
-        return pbkdf2_sha256.verify(password, self.password)
+    async def verify_password(self, password: str) -> bool:
+        return await password_hasher.verify(password, self.password)
 
     def __repr__(self):
         return self.username
@@ -1,5 +1,10 @@
 #!/bin/bash
 
-alembic upgrade head
+# development: single process reloading on changes
+if [ "$APP_RELOAD" = "true" ]; then
+    alembic upgrade heads
+    exec uvicorn main:app --reload --host 0.0.0.0 --port 8080
+fi
 
-uvicorn main:app --reload --host 0.0.0.0 --port 8080
\ No newline at end of file
+# exec, so the server gets SIGTERM of the container directly and drains workers
+exec python -m server
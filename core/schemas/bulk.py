@@ -0,0 +1,21 @@
+from typing import Generic, List, TypeVar
+
+from pydantic import BaseModel
+from pydantic.generics import GenericModel
+
+ItemType = TypeVar('ItemType')
+
+
+class BulkErrorSchema(BaseModel):
+    # position of the failed item in the request payload
+    index: int
+    detail: str
+
+
+class BulkResultSchema(GenericModel, Generic[ItemType]):
+    items: List[ItemType]
+    errors: List[BulkErrorSchema]
+
+
+class BulkDeleteSchema(BaseModel):
+    ids: List[int]
@@ -0,0 +1,11 @@
+from typing import Generic, List, Optional, TypeVar
+
+from pydantic.generics import GenericModel
+
+ItemType = TypeVar('ItemType')
+
+
+class PageSchema(GenericModel, Generic[ItemType]):
+    items: List[ItemType]
+    # opaque token for the next page request, None on the last page
+    next_cursor: Optional[str]
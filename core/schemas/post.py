@@ -7,7 +7,7 @@ from pydantic import BaseModel, constr
 class PostCategorySchema(BaseModel):
     id: int
     title: str
-    description: str
+    description: Optional[str]
 
     # to use .from_orm() for translating from Model to Schema,
     # e.g. PostCategorySchema.from_orm(model_instance) -> id=1 title='foo' description='bar'
@@ -26,10 +26,12 @@ class PostCategoryCreateUpdateSchema(BaseModel):
 class PostSchema(BaseModel):
     id: int
     title: str
-    text: str
+    text: Optional[str]
     time_created: datetime
     time_updated: Optional[datetime]
-    category: str
+    category_id: int
+    # title of the category, posts only store its id; resolved by PostService
+    category: Optional[str]
     validated: bool
 
     class Config:
@@ -50,3 +52,7 @@ class PostUpdateValidatedSchema(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class PostBulkUpdateValidatedSchema(PostUpdateValidatedSchema):
+    id: int
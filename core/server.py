@@ -0,0 +1,137 @@
+"""Production server: migrates the database, then serves the app from several worker processes.
+
+Socket is bound once here and shared by workers, each one running uvicorn with uvloop and httptools.
+Workers that die are replaced. On SIGTERM or SIGINT workers stop accepting connections and finish
+requests in flight; the ones still running after the drain timeout are killed.
+
+Usage: python -m server
+"""
+import importlib
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import tempfile
+import threading
+import time
+from multiprocessing.context import SpawnProcess
+from typing import List
+
+import uvicorn
+from alembic import command
+from alembic.config import Config as AlembicConfig
+from alembic.script import ScriptDirectory
+
+from core.config import METRICS, SERVER
+
+logger = logging.getLogger('uvicorn.error')
+
+
+# revisions dropping what instances of the previous release still use, applied by hand after rollout
+CONTRACT_BRANCH = 'contract'
+
+
+def migrate() -> None:
+    config = AlembicConfig('alembic.ini')
+    script = ScriptDirectory.from_config(config)
+    # concurrent upgrades wait for each other on advisory lock, see migrations/env.py
+    for head in script.get_heads():
+        if CONTRACT_BRANCH not in script.get_revision(head).branch_labels:
+            command.upgrade(config, head)
+
+
+def prepare_metrics_dir() -> None:
+    # read by workers from the environment, multiprocessing starts them afresh
+    directory = METRICS['MULTIPROCESS_DIR'] or tempfile.mkdtemp(prefix='forum-metrics-')
+    os.makedirs(directory, exist_ok=True)
+    os.environ['METRICS_MULTIPROCESS_DIR'] = directory
+    # snapshots of a previous run would be summed in, their pids may be taken again
+    for name in os.listdir(directory):
+        if name.startswith('metrics_'):
+            os.remove(os.path.join(directory, name))
+
+
+def run_worker(config: uvicorn.Config, sockets: List[socket.socket]) -> None:
+    config.configure_logging()
+    uvicorn.Server(config).run(sockets=sockets)
+
+
+class Supervisor:
+    """Pre-fork process manager, keeping workers count of uvicorn workers running on the shared socket."""
+
+    def __init__(self, config: uvicorn.Config, workers: int, drain_timeout: float) -> None:
+        self.config = config
+        self.workers = workers
+        self.drain_timeout = drain_timeout
+        self.should_exit = threading.Event()
+        self.processes: List[SpawnProcess] = []
+
+    def handle_exit(self, sig, frame) -> None:
+        self.should_exit.set()
+
+    def spawn(self, sockets: List[socket.socket]) -> SpawnProcess:
+        # fresh interpreter, nothing such as pool connections is inherited from here
+        process = multiprocessing.get_context('spawn').Process(target=run_worker, args=(self.config, sockets))
+        process.start()
+        return process
+
+    def run(self) -> None:
+        sockets = [self.config.bind_socket()]
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, self.handle_exit)
+
+        self.processes = [self.spawn(sockets) for _ in range(self.workers)]
+        logger.info('Started %d workers', self.workers)
+        while not self.should_exit.wait(1):
+            for index, process in enumerate(self.processes):
+                if not process.is_alive():
+                    logger.warning('Worker %d exited with code %s, replacing it', process.pid, process.exitcode)
+                    self.processes[index] = self.spawn(sockets)
+
+        logger.info('Draining workers, %.0f seconds at most', self.drain_timeout)
+        for process in self.processes:
+            process.terminate()
+        deadline = time.monotonic() + self.drain_timeout
+        for process in self.processes:
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                logger.warning('Worker %d did not finish in time, killing it', process.pid)
+                process.kill()
+                process.join()
+        for listening in sockets:
+            listening.close()
+
+
+def main() -> None:
+    # fail here when missing, not in every worker started
+    for module in ('uvloop', 'httptools'):
+        importlib.import_module(module)
+
+    config = uvicorn.Config(
+        'main:app',
+        host=SERVER['HOST'],
+        port=SERVER['PORT'],
+        # fail on start when missing instead of falling back to asyncio loop and h11
+        loop='uvloop',
+        http='httptools',
+        lifespan='on',
+        timeout_keep_alive=SERVER['KEEP_ALIVE'],
+        proxy_headers=True,
+    )
+    if SERVER['MIGRATE']:
+        migrate()
+    # after migrations, alembic logging setup disables loggers configured before it
+    config.configure_logging()
+
+    if METRICS['ENABLED'] and SERVER['WORKERS'] > 1:
+        prepare_metrics_dir()
+
+    if SERVER['WORKERS'] > 1:
+        Supervisor(config, SERVER['WORKERS'], SERVER['DRAIN_TIMEOUT']).run()
+    else:
+        uvicorn.Server(config).run()
+
+
+if __name__ == '__main__':
+    main()
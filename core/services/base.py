@@ -1,26 +1,63 @@
-from typing import Generic, List, Optional, TypeVar, Union
+import re
+from typing import Any, AsyncIterator, Callable, Dict, Generic, List, Optional, Sequence, Tuple, Type, TypeVar, Union
 
 from fastapi import HTTPException
 from pydantic import BaseModel
-from sqlalchemy import select, Column, or_
+from sqlalchemy import select, insert, update, delete, inspect, Column, and_, or_, true, tuple_, PrimaryKeyConstraint, UniqueConstraint
 from sqlalchemy.engine.result import ChunkedIteratorResult
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.engine.row import Row
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncResult
+from sqlalchemy.sql.base import Executable
 from sqlalchemy.sql.selectable import Select
 from sqlalchemy.sql.elements import BinaryExpression
 
+from core.config import PAGINATION, STREAMING, BULK
 from db.database import Base
+from services.filters import Filter
+from services.pagination import decode_cursor, encode_cursor
 
 ModelType = TypeVar("ModelType", bound=Base)
 SchemaType = TypeVar("SchemaType", bound=BaseModel)
 
+# Postgres error codes, see https://www.postgresql.org/docs/current/errcodes-appendix.html
+UNIQUE_VIOLATION = '23505'
+FOREIGN_KEY_VIOLATION = '23503'
+# e.g. 'Key (email)=(foo@bar.com) already exists.'
+INTEGRITY_DETAIL_RE = re.compile(r'Key \((?P<field>.+?)\)=\((?P<value>.*)\)')
+
 
 class BaseService(Generic[ModelType]):
-    def __init__(self, model: ModelType, model_pk: Column, db_session: AsyncSession):
+    # whitelists of list query parameters, see filter_condition and set_order;
+    # every allowed combination must be index-backed, see tests/test_query_plans.py
+    filters: Dict[str, Filter] = {}
+    orderings: Dict[str, Column] = {}
+
+    def __init__(
+        self,
+        model: ModelType,
+        model_pk: Column,
+        db_session: AsyncSession,
+        order_by: Optional[Sequence[Column]] = None,
+        descending: bool = False,
+    ):
         self._model = model
         self._model_name = model.__name__
         self._model_pk = model_pk
-        self._constraints = [constraint.columns.keys()[0] for constraint in model.__table__.constraints]
+        # keyset used for cursor pagination, must be unique as a whole, so primary key is always the last column
+        self._order_by = tuple(order_by) if order_by else (model_pk,)
+        self._descending = descending
+        self._constraints = [
+            constraint.columns.keys()[0] for constraint in model.__table__.constraints
+            if isinstance(constraint, (PrimaryKeyConstraint, UniqueConstraint))
+        ]
+        # deferred columns (e.g. search vectors) are neither loaded with entities nor selected as rows
+        self._columns = [prop.columns[0] for prop in inspect(model).column_attrs if not prop.deferred]
         self._db_session = db_session
+        self._orm_delete_cascades = any(
+            relationship.cascade.delete or relationship.cascade.delete_orphan
+            for relationship in inspect(model).relationships
+        )
 
     async def duplicate_exists(self, model_field: Column, payload_value: Union[int, str]) -> None:
         """BaseService method for duplicate validation.
@@ -54,6 +91,32 @@ class BaseService(Generic[ModelType]):
         if duplicate.scalars().all():
             raise HTTPException(status_code=400, detail=f"{self._model_name} with provided values already exists!")
 
+    def _integrity_error(self, err: IntegrityError) -> HTTPException:
+        """Maps constraint violation raised by DB back to the offending field.
+
+        Gives the same detailed error as duplicate_exists, without querying before writing.
+        """
+        # asyncpg exception, wrapped by SQLAlchemy DBAPI adapter
+        cause = err.orig.__cause__
+        match = INTEGRITY_DETAIL_RE.search(getattr(cause, 'detail', None) or '')
+        if match is None:
+            return HTTPException(status_code=400, detail=f"{self._model_name} with provided values already exists!")
+
+        field, value = match.group('field'), match.group('value')
+        if getattr(cause, 'sqlstate', None) == FOREIGN_KEY_VIOLATION:
+            # raised on delete of referenced row, e.g. 'Key (title)=(news) is still referenced from table "posts".'
+            if 'still referenced' in cause.detail:
+                return HTTPException(status_code=400, detail=f"{self._model_name} with {field} {value} is still referenced!")
+            return HTTPException(status_code=400, detail=f"{self._model_name} {field} {value} does not exist!")
+        return HTTPException(status_code=400, detail=f"{self._model_name} with {field} {value} already exists!")
+
+    async def _prepare_values(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        """Hook translating payload values to column values before they are written."""
+        return values
+
+    async def _after_load(self, items: Sequence[Union[ModelType, Row]]) -> None:
+        """Hook called with loaded entities or rows before they are returned for serialization."""
+
     async def get(self, value: Union[int, str], column: Optional[Column] = None) -> Optional[ModelType]:
         if column is None:
             column = self._model_pk
@@ -66,38 +129,320 @@ class BaseService(Generic[ModelType]):
         db_obj: Optional[ModelType] = res.scalar()
         if db_obj is None:
             raise HTTPException(status_code=404, detail="Not Found")
+        await self._after_load([db_obj])
         return db_obj
 
-    async def list(self, sub_stmt: Union[BinaryExpression, bool] = True) -> List[ModelType]:
-        stmt: Select = select(self._model).where(sub_stmt)
+    async def filter_condition(self, values: Dict[str, Any]) -> BinaryExpression:
+        """Conjunction of whitelisted filters by name, those with None value are skipped."""
+        conditions = [
+            await self.filters[name].condition(self._db_session, value)
+            for name, value in values.items() if value is not None
+        ]
+        return and_(true(), *conditions)
+
+    def set_order(self, order: Optional[str]) -> None:
+        """Applies whitelisted ordering to list pages, e.g. 'time_created', or '-time_created' for descending.
+
+        Primary key is appended to keep the keyset unique; cursors are valid for the same ordering only.
+        """
+        if order is None:
+            return
+
+        name = order[1:] if order.startswith('-') else order
+        if name not in self.orderings:
+            raise HTTPException(status_code=400, detail=f"Ordering by {name} is not allowed!")
+        column = self.orderings[name]
+        self._order_by = (column,) if column is self._model_pk else (column, self._model_pk)
+        self._descending = order.startswith('-')
+
+    def _keyset_condition(self, values: List[Any]) -> BinaryExpression:
+        if len(self._order_by) == 1:
+            keyset, values = self._order_by[0], values[0]
+        else:
+            keyset = tuple_(*self._order_by)
+            values = tuple_(*values)
+        return keyset < values if self._descending else keyset > values
+
+    def _order_clause(self) -> List[BinaryExpression]:
+        return [column.desc() if self._descending else column.asc() for column in self._order_by]
+
+    def list_stmt(
+        self,
+        sub_stmt: Union[BinaryExpression, bool] = True,
+        cursor: Optional[str] = None,
+        limit: int = PAGINATION['DEFAULT_LIMIT'],
+        columns: Optional[Sequence[Column]] = None,
+    ) -> Select:
+        stmt: Select = select(*columns) if columns else select(self._model)
+        stmt = stmt.where(sub_stmt)
+        if cursor is not None:
+            stmt = stmt.where(self._keyset_condition(decode_cursor(cursor, self._order_by)))
+
+        # one extra row tells whether the next page exists without a COUNT query
+        return stmt.order_by(*self._order_clause()).limit(limit + 1)
+
+    async def list(
+        self,
+        sub_stmt: Union[BinaryExpression, bool] = True,
+        cursor: Optional[str] = None,
+        limit: int = PAGINATION['DEFAULT_LIMIT'],
+        columns: Optional[Sequence[Column]] = None,
+    ) -> Dict[str, Any]:
+        """BaseService method for keyset (cursor) pagination.
+
+        Seeks straight to the row after the cursor instead of using OFFSET,
+        so every page costs the same as the first one.
+        With columns, page holds column rows instead of entities.
+        """
+        limit = min(limit, PAGINATION['MAX_LIMIT'])
+        stmt = self.list_stmt(sub_stmt, cursor, limit, columns)
         res: ChunkedIteratorResult = await self._db_session.execute(stmt)
-        return res.scalars().all()
+        items: List[Union[ModelType, Row]] = res.all() if columns else res.scalars().all()
+
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = encode_cursor([getattr(items[-1], column.key) for column in self._order_by])
+        await self._after_load(items)
+        return {'items': items, 'next_cursor': next_cursor}
+
+    def schema_columns(self, schema: Type[BaseModel], fields: Optional[Sequence[str]] = None) -> List[Column]:
+        """Table columns backing fields of schema (or only the given ones), plus order columns needed for cursors."""
+        names = set(fields or schema.__fields__)
+        columns = [column for column in self._columns if column.key in names]
+        keys = {column.key for column in columns}
+        return columns + [column for column in self._order_by if column.key not in keys]
+
+    def _row_dict(self, row: Row) -> Dict[str, Any]:
+        # hook for fields not stored in the table
+        return dict(row._mapping)
+
+    async def list_rows(
+        self,
+        schema: Type[BaseModel],
+        sub_stmt: Union[BinaryExpression, bool] = True,
+        cursor: Optional[str] = None,
+        limit: int = PAGINATION['DEFAULT_LIMIT'],
+        fields: Optional[Sequence[str]] = None,
+    ) -> Dict[str, Any]:
+        """Same page as list, but only columns backing schema fields (or the requested subset) are selected.
+
+        Fast path for read endpoints: no entities are built and large columns not asked for
+        are not read at all. Turn items into response dicts with row_dicts.
+        """
+        return await self.list(sub_stmt, cursor, limit, columns=self.schema_columns(schema, fields))
+
+    def row_dicts(
+        self,
+        rows: Sequence[Row],
+        schema: Type[BaseModel],
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Column rows as plain dicts of schema fields, in schema order.
+
+        Items are not validated against schema, so they can be encoded to JSON right away,
+        see api.responses.FastJSONResponse.
+        """
+        fields = [field for field in schema.__fields__ if fields is None or field in fields]
+        items = (self._row_dict(row) for row in rows)
+        return [{field: item[field] for field in fields} for item in items]
+
+    async def stream(
+        self,
+        sub_stmt: Union[BinaryExpression, bool] = True,
+        chunk_size: int = STREAMING['CHUNK_SIZE'],
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """BaseService method for streaming whole result sets, e.g. exports.
+
+        Rows are fetched through a server-side cursor in chunks and yielded as plain dicts, like row_dicts.
+        Column rows are selected instead of entities, so they are not kept in the session identity map
+        and memory stays flat.
+        """
+        stmt: Select = select(*self._columns).where(sub_stmt).order_by(*self._order_clause())
+        res: AsyncResult = await self._db_session.stream(stmt)
+        async for partition in res.partitions(chunk_size):
+            await self._after_load(partition)
+            yield [self._row_dict(row) for row in partition]
 
     async def create(self, data: SchemaType) -> ModelType:
-        for field, value in data.dict().items():
-            if field in self._constraints:
-                column = getattr(self._model, field)
-                await self.duplicate_exists(column, value)
-        
-        db_obj = self._model(**data.dict())
+        # uniqueness is left to DB constraints: single INSERT and no race between check and insert
+        db_obj = self._model(**await self._prepare_values(data.dict()))
         self._db_session.add(db_obj)
         # For Pydantic: .flush() adds values to db_obj, that generates on DB side e.g. Primary Keys or server_default values
-        await self._db_session.flush()
+        try:
+            await self._db_session.flush()
+        except IntegrityError as err:
+            raise self._integrity_error(err)
+        await self._after_load([db_obj])
         return db_obj
 
     async def update(self, id: Union[int, str], data: SchemaType) -> ModelType:
-        db_obj = await self.get(id)
-        for field, value in data.dict(exclude_unset=True).items():
-            if getattr(db_obj, field) == value:
-                continue
+        """BaseService method for update within a single UPDATE ... WHERE pk = :id RETURNING.
 
-            if field in self._constraints:
-                column = getattr(self._model, field)
-                await self.duplicate_exists(column, value)
+        Uniqueness is left to DB constraints, same as in create.
+        """
+        values = await self._prepare_values(data.dict(exclude_unset=True))
+        if not values:
+            return await self.get(id)
 
-            setattr(db_obj, field, value)
+        stmt = (
+            update(self._model)
+            .where(self._model_pk == id)
+            .values(**values)
+            .returning(*self._columns)
+        )
+        # loads returned row as entity, refreshing it in identity map if it was loaded before
+        stmt = select(self._model).from_statement(stmt).execution_options(populate_existing=True)
+        try:
+            res: ChunkedIteratorResult = await self._db_session.execute(stmt)
+        except IntegrityError as err:
+            raise self._integrity_error(err)
+
+        db_obj: Optional[ModelType] = res.scalar()
+        if db_obj is None:
+            raise HTTPException(status_code=404, detail="Not Found")
+        await self._after_load([db_obj])
         return db_obj
 
     async def delete(self, id: Union[int, str]) -> None:
-        db_obj = await self.get(id)
-        await self._db_session.delete(db_obj)
+        """BaseService method for deletion within a single DELETE ... WHERE pk = :id RETURNING pk.
+
+        Models with Python-side delete cascades still go through ORM, so that cascades are applied.
+        """
+        if self._orm_delete_cascades:
+            db_obj = await self.get(id)
+            await self._db_session.delete(db_obj)
+            return
+
+        stmt = delete(self._model).where(self._model_pk == id).returning(self._model_pk)
+        try:
+            res: ChunkedIteratorResult = await self._db_session.execute(stmt)
+        except IntegrityError as err:
+            raise self._integrity_error(err)
+
+        if res.scalar() is None:
+            raise HTTPException(status_code=404, detail="Not Found")
+
+    def _check_bulk_size(self, items: Sequence[Any]) -> None:
+        if not items:
+            raise HTTPException(status_code=400, detail="No items provided!")
+        if len(items) > BULK['MAX_ITEMS']:
+            raise HTTPException(status_code=400, detail=f"Bulk operations are limited to {BULK['MAX_ITEMS']} items!")
+
+    async def _execute_in_savepoint(self, stmt: Executable) -> Tuple[List[Row], Optional[HTTPException]]:
+        # savepoint keeps the outer transaction usable after a constraint violation
+        try:
+            async with self._db_session.begin_nested():
+                res: ChunkedIteratorResult = await self._db_session.execute(stmt)
+                return res.all(), None
+        except IntegrityError as err:
+            return [], self._integrity_error(err)
+
+    async def _execute_bulk(
+        self,
+        groups: List[List[int]],
+        build_stmt: Callable[[List[int]], Executable],
+    ) -> Dict[str, Any]:
+        """Runs one statement per group of payload item indexes, reporting errors per item.
+
+        When statement of a group violates a constraint, the group is retried item by item
+        to find the offending ones and keep the rest.
+        """
+        rows: List[Row] = []
+        errors: List[Dict[str, Union[int, str]]] = []
+        for indexes in groups:
+            group_rows, error = await self._execute_in_savepoint(build_stmt(indexes))
+            if error is None:
+                rows.extend(group_rows)
+            elif len(indexes) == 1:
+                errors.append({'index': indexes[0], 'detail': error.detail})
+            else:
+                retried = await self._execute_bulk([[index] for index in indexes], build_stmt)
+                rows.extend(retried['items'])
+                errors.extend(retried['errors'])
+        return {'items': rows, 'errors': errors}
+
+    @staticmethod
+    def _report_missing(result: Dict[str, Any], ids: List[Union[int, str]], found: List[Union[int, str]]) -> Dict[str, Any]:
+        failed = {error['index'] for error in result['errors']}
+        found = set(found)
+        for index, id in enumerate(ids):
+            if index not in failed and id not in found:
+                result['errors'].append({'index': index, 'detail': "Not Found"})
+        result['errors'].sort(key=lambda error: error['index'])
+        return result
+
+    async def bulk_create(self, items: List[SchemaType]) -> Dict[str, Any]:
+        """BaseService method for batched creation with a single multi-row INSERT ... RETURNING."""
+        self._check_bulk_size(items)
+        values: Dict[int, Dict[str, Any]] = {}
+        errors: List[Dict[str, Union[int, str]]] = []
+        for index, item in enumerate(items):
+            try:
+                values[index] = await self._prepare_values(item.dict())
+            except HTTPException as err:
+                errors.append({'index': index, 'detail': err.detail})
+        returning = self._columns
+
+        def build_stmt(indexes: List[int]) -> Executable:
+            return insert(self._model).values([values[index] for index in indexes]).returning(*returning)
+
+        result = await self._execute_bulk([list(values)] if values else [], build_stmt)
+        result['errors'] = sorted(errors + result['errors'], key=lambda error: error['index'])
+        await self._after_load(result['items'])
+        result['items'] = [self._row_dict(row) for row in result['items']]
+        return result
+
+    async def bulk_update(self, items: List[SchemaType]) -> Dict[str, Any]:
+        """BaseService method for batched update, every item must contain primary key.
+
+        Items with equal new values share a single UPDATE ... WHERE pk IN (...) RETURNING,
+        so e.g. moderation sweep toggling one flag costs one or two statements.
+        """
+        self._check_bulk_size(items)
+        pk_name = self._model_pk.key
+        ids: List[Union[int, str]] = []
+        values: Dict[int, Dict[str, Any]] = {}
+        errors: List[Dict[str, Union[int, str]]] = []
+        groups: Dict[Tuple[Tuple[str, Any], ...], List[int]] = {}
+        for index, item in enumerate(items):
+            item_values = item.dict(exclude_unset=True)
+            ids.append(item_values.pop(pk_name))
+            try:
+                item_values = await self._prepare_values(item_values)
+            except HTTPException as err:
+                errors.append({'index': index, 'detail': err.detail})
+                continue
+            values[index] = item_values
+            groups.setdefault(tuple(sorted(item_values.items())), []).append(index)
+
+        def build_stmt(indexes: List[int]) -> Executable:
+            return (
+                update(self._model)
+                .where(self._model_pk.in_([ids[index] for index in indexes]))
+                .values(**values[indexes[0]])
+                .returning(*self._columns)
+                .execution_options(synchronize_session=False)
+            )
+
+        result = await self._execute_bulk(list(groups.values()), build_stmt)
+        result['errors'] += errors
+        await self._after_load(result['items'])
+        result['items'] = [self._row_dict(row) for row in result['items']]
+        return self._report_missing(result, ids, [item[pk_name] for item in result['items']])
+
+    async def bulk_delete(self, ids: List[Union[int, str]]) -> Dict[str, Any]:
+        """BaseService method for batched deletion with a single DELETE ... WHERE pk IN (...) RETURNING pk."""
+        self._check_bulk_size(ids)
+
+        def build_stmt(indexes: List[int]) -> Executable:
+            return (
+                delete(self._model)
+                .where(self._model_pk.in_([ids[index] for index in indexes]))
+                .returning(self._model_pk)
+                .execution_options(synchronize_session=False)
+            )
+
+        result = await self._execute_bulk([list(range(len(ids)))], build_stmt)
+        result['items'] = [row[0] for row in result['items']]
+        return self._report_missing(result, ids, result['items'])
@@ -0,0 +1,133 @@
+import json
+import time
+import uuid
+from collections import OrderedDict
+from importlib import import_module
+from typing import Any, Optional, Tuple
+
+
+class CacheBackend:
+    """Interface for cache backends.
+
+    Values must be JSON-serializable, so that an in-process backend can be swapped
+    for a shared one (e.g. Redis) without changing the callers.
+    """
+
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    async def delete(self, *keys: str) -> None:
+        raise NotImplementedError
+
+    async def clear(self) -> None:
+        raise NotImplementedError
+
+
+class InMemoryCache(CacheBackend):
+    """Per-process LRU cache with TTL, bounded by number of entries."""
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: 'OrderedDict[str, Tuple[Optional[float], Any]]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._data.pop(key, None)
+
+    async def clear(self) -> None:
+        self._data.clear()
+
+
+class LocalSharedCache(InMemoryCache):
+    """Stand-in for a shared backend (e.g. Redis) in tests and single-process development.
+
+    All instances share the same entries, as workers sharing a cache server would, and values
+    are copied through JSON on the way in and out, as they would be sent over the network.
+    """
+    _shared_data: 'OrderedDict[str, Tuple[Optional[float], Any]]' = OrderedDict()
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None) -> None:
+        super().__init__(max_size, ttl)
+        self._data = self._shared_data
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = await super().get(key)
+        return json.loads(value) if value is not None else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await super().set(key, json.dumps(value), ttl)
+
+
+def create_cache(backend: str, **kwargs) -> CacheBackend:
+    """Builds cache from dotted path to backend class, e.g. CACHE['BACKEND'] from core.config."""
+    module_name, _, class_name = backend.rpartition('.')
+    backend_class = getattr(import_module(module_name), class_name)
+    return backend_class(**kwargs)
+
+
+class ResponseCache:
+    """Serialized responses kept in a cache backend, invalidated all at once.
+
+    Keys are prefixed with generation, a random token kept in the backend as well, so with a shared
+    backend invalidation by one worker is seen by all of them. Invalidation only replaces the token,
+    stale entries are evicted by LRU or TTL. Response loaded before invalidation is stored under its
+    old generation and never served; when the token itself is evicted, a new one is started.
+    """
+
+    def __init__(self, backend: CacheBackend, prefix: str) -> None:
+        self.backend = backend
+        self.prefix = prefix
+
+    def _key(self, key: str, generation: str) -> str:
+        return f'{self.prefix}:{generation}:{key}'
+
+    def _generation_key(self) -> str:
+        return f'{self.prefix}:generation'
+
+    async def generation(self) -> str:
+        """Current generation, pass it to get and set of the response loaded afterwards."""
+        generation = await self.backend.get(self._generation_key())
+        if generation is None:
+            generation = await self.invalidate()
+        return generation
+
+    async def get(self, key: str, generation: str) -> Optional[Any]:
+        return await self.backend.get(self._key(key, generation))
+
+    async def set(self, key: str, value: Any, generation: str) -> None:
+        # invalidated while loading, entry would never be served
+        if generation == await self.backend.get(self._generation_key()):
+            await self.backend.set(self._key(key, generation), value)
+
+    async def invalidate(self) -> str:
+        generation = uuid.uuid4().hex
+        await self.backend.set(self._generation_key(), generation)
+        return generation
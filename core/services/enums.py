@@ -3,4 +3,9 @@ from enum import Enum
 
 class RolesEnum(Enum):
     ADMIN = 'admin'
-    USER = 'user'
\ No newline at end of file
+    USER = 'user'
+
+
+class StreamFormatEnum(Enum):
+    JSON = 'json'
+    NDJSON = 'ndjson'
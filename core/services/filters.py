@@ -0,0 +1,39 @@
+import operator
+from typing import Any, Awaitable, Callable, Optional, Type
+
+from sqlalchemy import Column
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.elements import BinaryExpression
+
+OPERATORS = {
+    'eq': operator.eq,
+    'gt': operator.gt,
+    'lt': operator.lt,
+}
+
+
+class Filter:
+    """Whitelisted list filter, compiled into a condition on a single column.
+
+    Value comes typed after python_type (column type by default); resolve maps it
+    to the stored value first, e.g. category title to category id.
+    """
+
+    def __init__(
+        self,
+        column: Column,
+        op: str = 'eq',
+        python_type: Optional[Type] = None,
+        resolve: Optional[Callable[[AsyncSession, Any], Awaitable[Any]]] = None,
+        description: Optional[str] = None,
+    ) -> None:
+        self.column = column
+        self.operator = OPERATORS[op]
+        self.python_type = python_type or column.type.python_type
+        self.resolve = resolve
+        self.description = description
+
+    async def condition(self, db_session: AsyncSession, value: Any) -> BinaryExpression:
+        if self.resolve is not None:
+            value = await self.resolve(db_session, value)
+        return self.operator(self.column, value)
@@ -0,0 +1,71 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, TypeVar, Union
+
+from passlib.hash import pbkdf2_sha256
+
+from core.config import HASHING
+
+ResultType = TypeVar('ResultType')
+
+
+class PasswordHasher:
+    """Runs pbkdf2 hashing in a bounded thread pool instead of the event loop.
+
+    hashlib releases the GIL while deriving keys, so threads spread login bursts across cores.
+    Semaphore bounds how many hashes are submitted at once; the rest wait on it and are counted as queued.
+    """
+
+    def __init__(self, max_workers: int, max_concurrency: int) -> None:
+        self.max_workers = max_workers
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='password-hasher')
+        # created lazily, semaphore must belong to the running event loop
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._queued = 0
+        self._in_flight = 0
+        self._completed = 0
+        self._wait_seconds = 0.0
+
+    async def _run(self, func: Callable[..., ResultType], *args) -> ResultType:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        self._queued += 1
+        started = time.perf_counter()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._queued -= 1
+        self._wait_seconds += time.perf_counter() - started
+
+        self._in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self._in_flight -= 1
+            self._completed += 1
+            self._semaphore.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(pbkdf2_sha256.hash, password)
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        return await self._run(pbkdf2_sha256.verify, password, password_hash)
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        return {
+            'max_workers': self.max_workers,
+            'max_concurrency': self.max_concurrency,
+            'queued': self._queued,
+            'in_flight': self._in_flight,
+            'completed': self._completed,
+            'wait_seconds_total': self._wait_seconds,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+password_hasher = PasswordHasher(max_workers=HASHING['MAX_WORKERS'], max_concurrency=HASHING['MAX_CONCURRENCY'])
@@ -0,0 +1,40 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, List, Sequence
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import Column
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Packs keyset values of the last row on a page into an opaque url-safe token."""
+    raw = json.dumps(jsonable_encoder(list(values)), separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, columns: Sequence[Column]) -> List[Any]:
+    """Unpacks cursor back into python values, typed after the keyset columns."""
+    error = HTTPException(status_code=400, detail='Invalid cursor!')
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise error
+
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise error
+
+    decoded: List[Any] = []
+    for column, value in zip(columns, values):
+        try:
+            if column.type.python_type is datetime:
+                value = datetime.fromisoformat(value)
+            else:
+                value = column.type.python_type(value)
+        except (TypeError, ValueError):
+            raise error
+        decoded.append(value)
+    return decoded
@@ -1,25 +1,341 @@
-from fastapi import Depends
+import asyncio
+import bisect
+import hashlib
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Type, Union
+
+from fastapi import Depends, HTTPException
+from pydantic import BaseModel
+from sqlalchemy import select, func, literal_column, Column, Float
+from sqlalchemy.engine.result import ChunkedIteratorResult
+from sqlalchemy.engine.row import Row
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.elements import BinaryExpression
+
+from core.config import PAGINATION, CACHE
+from db.database import get_db, primary_read_session
+from db.notifications import notification_listener
+from models.post import Post, PostCategory, SEARCH_CONFIG
+from services.base import BaseService, SchemaType
+from services.cache import ResponseCache, create_cache
+from services.filters import Filter
+from services.pagination import decode_cursor, encode_cursor
+
+
+class CategoryCache:
+    """Read-through cache holding the whole set of post categories in memory.
+
+    Categories are few and rarely change, so the table is loaded at once on the first miss and
+    reads are served without DB I/O afterwards. Writes bump version and NOTIFY other workers,
+    which drop their copy once the write is committed, see db.notifications.
+    Without listener (disabled or connection lost), copy expires after CACHE['CATEGORY_TTL'].
+    Copy is always loaded from the primary: one loaded from a lagging replica after the notification
+    would be kept stale until the next one.
+    """
+    channel = 'post_categories'
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self.version = 0
+        self._categories: Dict[int, Row] = {}
+        self._ids: Dict[str, int] = {}
+        self._stale = True
+        self._loaded_at = 0.0
+        # digest of loaded categories, same in every worker for the same data
+        self.etag = ''
+        notification_listener.subscribe(self.channel, lambda payload: self.invalidate())
+
+    def _fresh(self) -> bool:
+        if self._stale:
+            return False
+        return notification_listener.listening or time.monotonic() - self._loaded_at < self.ttl
+
+    async def categories(self, db_session: AsyncSession) -> Dict[int, Row]:
+        """Categories by id, in id order."""
+        if self._fresh():
+            return self._categories
+
+        version = self.version
+        stmt = select(*PostCategory.__table__.columns).order_by(PostCategory.id)
+        async with primary_read_session(db_session) as session:
+            rows = (await session.execute(stmt)).all()
+        categories = {row.id: row for row in rows}
+        # invalidated while loading, loaded rows may be already stale
+        if version == self.version:
+            # both maps are replaced at once, readers never see partially loaded ones
+            self._categories, self._ids = categories, {row.title: row.id for row in categories.values()}
+            self._stale = False
+            self._loaded_at = time.monotonic()
+            self.etag = hashlib.sha1(repr([tuple(row) for row in categories.values()]).encode()).hexdigest()
+        return categories
+
+    def title(self, id: int) -> Optional[str]:
+        # stale copy is still used here, serialization runs after ensure_titles reloaded it anyway
+        category = self._categories.get(id)
+        return category.title if category is not None else None
+
+    async def ensure_titles(self, db_session: AsyncSession, ids: Iterable[int]) -> None:
+        if not self._fresh() or any(id not in self._categories for id in ids):
+            self.invalidate()
+            await self.categories(db_session)
+
+    async def id_for(self, db_session: AsyncSession, title: str) -> int:
+        if not self._fresh() or title not in self._ids:
+            self.invalidate()
+            await self.categories(db_session)
+        try:
+            return self._ids[title]
+        except KeyError:
+            raise HTTPException(status_code=400, detail=f"PostCategory with title {title} does not exist!")
+
+    def invalidate(self) -> None:
+        self.version += 1
+        self._stale = True
+
+    async def notify(self, db_session: AsyncSession) -> None:
+        """Invalidates local copy and, on commit of the current transaction, copies of other workers."""
+        self.invalidate()
+        await notification_listener.notify(db_session, self.channel, str(self.version))
+
 
-from db.database import get_db
-from models.post import Post, PostCategory
-from services.base import BaseService
+category_cache = CategoryCache(ttl=CACHE['CATEGORY_TTL'])
+
+# serialized pages of validated posts, served without querying; they include category titles,
+# so category writes drop them as well
+VALIDATED_FEED_CHANNEL = 'posts_validated'
+validated_feed_cache = ResponseCache(
+    create_cache(CACHE['BACKEND'], max_size=CACHE['FEED_MAX_SIZE'], ttl=CACHE['FEED_TTL']),
+    prefix=VALIDATED_FEED_CHANNEL,
+)
+
+
+def _on_feed_notification(payload: Optional[str]) -> None:
+    asyncio.get_running_loop().create_task(validated_feed_cache.invalidate())
+
+
+for channel in (VALIDATED_FEED_CHANNEL, CategoryCache.channel):
+    notification_listener.subscribe(channel, _on_feed_notification)
+
+
+async def notify_validated_feed(db_session: AsyncSession) -> None:
+    await validated_feed_cache.invalidate()
+    await notification_listener.notify(db_session, VALIDATED_FEED_CHANNEL)
 
 
 class PostCategoryService(BaseService[PostCategory]):
     def __init__(self, db_session: AsyncSession):
-        super().__init__(PostCategory, db_session)
+        super().__init__(PostCategory, PostCategory.id, db_session)
 
+    async def get(self, value: Union[int, str], column: Optional[Column] = None) -> Row:
+        if column is not None and column is not PostCategory.id:
+            return await super().get(value, column)
 
-class PostService(BaseService[PostCategory]):
-    def __init__(self, db_session: AsyncSession):
-        super().__init__(Post, db_session)
+        category = (await category_cache.categories(self._db_session)).get(int(value))
+        if category is None:
+            raise HTTPException(status_code=404, detail="Not Found")
+        return category
+
+    async def list(
+        self,
+        sub_stmt: Union[BinaryExpression, bool] = True,
+        cursor: Optional[str] = None,
+        limit: int = PAGINATION['DEFAULT_LIMIT'],
+        columns: Optional[Sequence[Column]] = None,
+    ) -> Dict[str, Any]:
+        if sub_stmt is not True:
+            return await super().list(sub_stmt, cursor, limit, columns)
+
+        # same pages as BaseService.list would give, sliced from cached categories ordered by id;
+        # cached rows hold all columns, so they serve column pages as well
+        items: List[Row] = list((await category_cache.categories(self._db_session)).values())
+        if cursor is not None:
+            after = decode_cursor(cursor, self._order_by)[0]
+            items = items[bisect.bisect_right([item.id for item in items], after):]
+
+        limit = min(limit, PAGINATION['MAX_LIMIT'])
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = encode_cursor([items[-1].id])
+        return {'items': items, 'next_cursor': next_cursor}
+
+    async def version(self) -> str:
+        """Version of all categories, changes with any category write."""
+        await category_cache.categories(self._db_session)
+        return category_cache.etag
+
+    async def _notify(self) -> None:
+        await category_cache.notify(self._db_session)
+        await validated_feed_cache.invalidate()
+
+    async def create(self, data: SchemaType) -> PostCategory:
+        db_obj = await super().create(data)
+        await self._notify()
+        return db_obj
 
-    async def list_validated(self):
-        return await super().list(Post.validated == True)
+    async def update(self, id: Union[int, str], data: SchemaType) -> PostCategory:
+        db_obj = await super().update(id, data)
+        await self._notify()
+        return db_obj
+
+    async def delete(self, id: Union[int, str]) -> None:
+        await super().delete(id)
+        await self._notify()
+
+    async def bulk_create(self, items: List[SchemaType]) -> Dict[str, Any]:
+        result = await super().bulk_create(items)
+        await self._notify()
+        return result
+
+    async def bulk_delete(self, ids: List[Union[int, str]]) -> Dict[str, Any]:
+        result = await super().bulk_delete(ids)
+        await self._notify()
+        return result
+
+
+class PostService(BaseService[Post]):
+    filters = {
+        'category': Filter(Post.category_id, python_type=str, resolve=category_cache.id_for, description='Category title'),
+        'validated': Filter(Post.validated),
+        'created_after': Filter(Post.time_created, 'gt'),
+        'created_before': Filter(Post.time_created, 'lt'),
+    }
+    orderings = {'time_created': Post.time_created}
+
+    def __init__(self, db_session: AsyncSession, order_by: Sequence[Column] = (Post.time_created, Post.id)):
+        # newest posts first, id breaks ties between posts created within the same transaction
+        super().__init__(Post, Post.id, db_session, order_by=order_by, descending=True)
+
+    async def _prepare_values(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        # payload refers to category by title
+        if 'category' in values:
+            values['category_id'] = await category_cache.id_for(self._db_session, values.pop('category'))
+        return values
+
+    async def _after_load(self, items: Sequence[Union[Post, Row]]) -> None:
+        await category_cache.ensure_titles(self._db_session, {item.category_id for item in items})
+        # rows get theirs in _row_dict
+        for item in items:
+            if isinstance(item, Post):
+                item.category = category_cache.title(item.category_id)
+
+    def schema_columns(self, schema: Type[BaseModel], fields: Optional[Sequence[str]] = None) -> List[Column]:
+        columns = super().schema_columns(schema, fields)
+        keys = {column.key for column in columns}
+        # category_id resolves category titles, time_updated is a part of page versions
+        return columns + [column for column in (Post.category_id, Post.time_updated) if column.key not in keys]
+
+    def _row_dict(self, row: Row) -> Dict[str, Any]:
+        item = dict(row._mapping)
+        item['category'] = category_cache.title(row.category_id)
+        return item
+
+    # writes touching validated posts drop cached pages of validated_feed_cache
+
+    async def create(self, data: SchemaType) -> Post:
+        db_obj = await super().create(data)
+        if db_obj.validated:
+            await notify_validated_feed(self._db_session)
+        return db_obj
+
+    async def update(self, id: Union[int, str], data: SchemaType) -> Post:
+        db_obj = await super().update(id, data)
+        # validated flag may have been just cleared
+        if db_obj.validated or 'validated' in data.dict(exclude_unset=True):
+            await notify_validated_feed(self._db_session)
+        return db_obj
+
+    async def delete(self, id: Union[int, str]) -> None:
+        await super().delete(id)
+        await notify_validated_feed(self._db_session)
+
+    async def bulk_create(self, items: List[SchemaType]) -> Dict[str, Any]:
+        result = await super().bulk_create(items)
+        if any(item['validated'] for item in result['items']):
+            await notify_validated_feed(self._db_session)
+        return result
+
+    async def bulk_update(self, items: List[SchemaType]) -> Dict[str, Any]:
+        result = await super().bulk_update(items)
+        if result['items']:
+            await notify_validated_feed(self._db_session)
+        return result
+
+    async def bulk_delete(self, ids: List[Union[int, str]]) -> Dict[str, Any]:
+        result = await super().bulk_delete(ids)
+        if result['items']:
+            await notify_validated_feed(self._db_session)
+        return result
+
+    @staticmethod
+    def page_version(items: Sequence[Union[Post, Row]], has_more: bool = False) -> Tuple[List[Any], Optional[datetime]]:
+        """Version of a list page and its last modification time.
+
+        Made of ids and modification times of the page posts and version of categories,
+        as posts are returned with category titles.
+        """
+        modified = [item.time_updated or item.time_created for item in items]
+        parts = [category_cache.etag, has_more, *zip((item.id for item in items), modified)]
+        return parts, max(modified, default=None)
+
+    async def versions(
+        self,
+        sub_stmt: Union[BinaryExpression, bool] = True,
+        cursor: Optional[str] = None,
+        limit: int = PAGINATION['DEFAULT_LIMIT'],
+    ) -> Tuple[List[Any], Optional[datetime]]:
+        """Same as page_version of the list page, but without loading its posts."""
+        limit = min(limit, PAGINATION['MAX_LIMIT'])
+        stmt = self.list_stmt(sub_stmt, cursor, limit).with_only_columns(Post.id, Post.time_created, Post.time_updated)
+        res: ChunkedIteratorResult = await self._db_session.execute(stmt)
+        rows = res.all()
+        await category_cache.categories(self._db_session)
+        return self.page_version(rows[:limit], len(rows) > limit)
+
+    async def list_validated(self, cursor: Optional[str] = None, limit: int = PAGINATION['DEFAULT_LIMIT']):
+        return await super().list(Post.validated == True, cursor=cursor, limit=limit)
     
-    async def list_unvalidated(self):
-        return await super().list(Post.validated == False)
+    async def list_unvalidated(self, cursor: Optional[str] = None, limit: int = PAGINATION['DEFAULT_LIMIT']):
+        return await super().list(Post.validated == False, cursor=cursor, limit=limit)
+
+    def stream_validated(self):
+        return super().stream(Post.validated == True)
+
+    def stream_unvalidated(self):
+        return super().stream(Post.validated == False)
+
+
+class PostSearchService(PostService):
+    """Full-text search over title and text of posts, most relevant first.
+
+    Matches are found through GIN index on Post.search_vector; query uses web search syntax,
+    e.g. 'async -sync "connection pool"'. Pages are keyset paginated by rank and id.
+    """
+
+    def __init__(self, db_session: AsyncSession, query: str):
+        self._tsquery = func.websearch_to_tsquery(literal_column(f"'{SEARCH_CONFIG}'::regconfig"), query)
+        rank = func.ts_rank(Post.search_vector, self._tsquery, type_=Float).label('rank')
+        super().__init__(db_session, order_by=(rank, Post.id))
+
+    def matches(self) -> BinaryExpression:
+        return Post.search_vector.op('@@')(self._tsquery)
+
+    async def search(
+        self,
+        schema: Type[BaseModel],
+        category: Optional[str] = None,
+        validated: Optional[bool] = None,
+        cursor: Optional[str] = None,
+        limit: int = PAGINATION['DEFAULT_LIMIT'],
+        fields: Optional[Sequence[str]] = None,
+    ) -> Dict[str, Any]:
+        sub_stmt = self.matches()
+        if category is not None:
+            sub_stmt &= Post.category_id == await category_cache.id_for(self._db_session, category)
+        if validated is not None:
+            sub_stmt &= Post.validated == validated
+        return await self.list_rows(schema, sub_stmt, cursor, limit, fields)
 
 
 def get_category_service(
@@ -1,27 +1,141 @@
+import asyncio
 import datetime
-from typing import Dict, Optional
+from typing import Dict, Optional, Union
 
 from fastapi import HTTPException, Depends
+from fastapi.encoders import jsonable_encoder
 from jose import jwt
+from sqlalchemy import select, delete, update
+from sqlalchemy.engine.result import ChunkedIteratorResult
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from core.config import JOSE
-from db.database import get_db
+from core.config import JOSE, CACHE
+from db.database import get_db, primary_read_session
+from db.notifications import notification_listener
 from models.user import User
-from schemas.user import UserLoginSchema
-from services.base import BaseService
+from schemas.user import UserCreateSchema, UserLoginSchema, UserSchema
+from services.base import BaseService, SchemaType
+from services.cache import CacheBackend, create_cache
+from services.filters import Filter
+from services.hashing import password_hasher
+
+
+class PrincipalCache:
+    """Authenticated users by token subject (email), saves a query per protected request.
+
+    Writes NOTIFY the changed emails and every worker drops their entries once the write is committed,
+    see db.notifications; user loaded while an invalidation arrived is not stored, it may be the old row.
+    Without listener (disabled or connection lost), entries expire after CACHE['PRINCIPAL_TTL'].
+    Misses are loaded from the primary, see db.database.primary_read_session.
+    """
+    channel = 'principals'
+
+    def __init__(self, backend: CacheBackend) -> None:
+        self.backend = backend
+        self.version = 0
+        notification_listener.subscribe(self.channel, self._on_notification)
+
+    @staticmethod
+    def _key(email: str) -> str:
+        return f'principal:{email}'
+
+    def _on_notification(self, payload: Optional[str]) -> None:
+        self.version += 1
+        # notifications may have been missed without payload
+        drop = self.backend.clear() if payload is None else self.backend.delete(self._key(payload))
+        asyncio.get_running_loop().create_task(drop)
+
+    async def get(self, email: str, db_session: AsyncSession) -> Optional[UserSchema]:
+        cached = await self.backend.get(self._key(email))
+        if cached is not None:
+            return UserSchema.parse_obj(cached)
+
+        version = self.version
+        async with primary_read_session(db_session) as session:
+            res: ChunkedIteratorResult = await session.execute(select(User).where(User.email == email))
+            user: Optional[User] = res.scalar()
+            if user is None:
+                return None
+            principal = UserSchema.from_orm(user)
+
+        if version == self.version:
+            await self.backend.set(self._key(email), jsonable_encoder(principal))
+        return principal
+
+    async def invalidate(self, db_session: AsyncSession, *emails: str) -> None:
+        """Drops entries in every worker on commit of the current transaction."""
+        if not notification_listener.listening:
+            self.version += 1
+            await self.backend.delete(*(self._key(email) for email in emails))
+        for email in emails:
+            await notification_listener.notify(db_session, self.channel, email)
+
+
+principal_cache = PrincipalCache(
+    create_cache(CACHE['BACKEND'], max_size=CACHE['PRINCIPAL_MAX_SIZE'], ttl=CACHE['PRINCIPAL_TTL'])
+)
+
+
+async def get_principal(email: str, db_session: AsyncSession) -> Optional[UserSchema]:
+    return await principal_cache.get(email, db_session)
 
 
 class UserService(BaseService[User]):
+    filters = {
+        'role': Filter(User.role),
+        'active': Filter(User.active),
+    }
+    orderings = {'id': User.id}
+
     def __init__(self, db_session: AsyncSession):
         super().__init__(User, User.id, db_session)
 
+    async def create(self, data: UserCreateSchema) -> User:
+        password = await password_hasher.hash(data.password)
+        return await super().create(data.copy(update={'password': password}))
+
+    async def update(self, id: Union[int, str], data: SchemaType) -> User:
+        """Single UPDATE ... RETURNING like BaseService.update, also returning the previous email.
+
+        Token subject of the previous email must stop resolving to this user too. Row is locked by
+        the FROM subquery, so the email read there is the one being replaced.
+        """
+        values = await self._prepare_values(data.dict(exclude_unset=True))
+        if not values:
+            return await self.get(id)
+
+        old = select(User.id, User.email.label('old_email')).where(User.id == id).with_for_update().subquery('old')
+        stmt = update(User).where(User.id == old.c.id).values(**values).returning(*self._columns, old.c.old_email)
+        stmt = select(User, old.c.old_email).from_statement(stmt).execution_options(populate_existing=True)
+        try:
+            res: ChunkedIteratorResult = await self._db_session.execute(stmt)
+        except IntegrityError as err:
+            raise self._integrity_error(err)
+
+        row = res.first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Not Found")
+        db_obj, old_email = row
+        await self._after_load([db_obj])
+        await principal_cache.invalidate(self._db_session, *{db_obj.email, old_email})
+        return db_obj
+
+    async def delete(self, id: Union[int, str]) -> None:
+        res: ChunkedIteratorResult = await self._db_session.execute(
+            delete(User).where(User.id == id).returning(User.email)
+        )
+        email: Optional[str] = res.scalar()
+        if email is None:
+            raise HTTPException(status_code=404, detail="Not Found")
+        await principal_cache.invalidate(self._db_session, email)
+
     async def login(self, data: UserLoginSchema) -> Optional[Dict[str, str]]:
         user = await self.get(data.email, User.email)
         if not user.active:
             raise HTTPException(status_code=403, detail="User not active!")
 
-        if user.verify_password(data.password):
+        if await user.verify_password(data.password):
             token = jwt.encode(
                 {
                     'exp': datetime.datetime.utcnow() + JOSE['ACCESS_TOKEN_LIFETIME'], 
@@ -0,0 +1,41 @@
+"""Response cache over per-process and shared backends; workers are stood in for by separate instances."""
+from services.cache import InMemoryCache, LocalSharedCache, ResponseCache
+
+
+def test_response_cache_skips_responses_loaded_before_invalidation(run) -> None:
+    async def check() -> None:
+        cache = ResponseCache(InMemoryCache(), prefix='feed')
+        generation = await cache.generation()
+        await cache.invalidate()
+        await cache.set('page', {'body': 'old'}, generation)
+        assert await cache.get('page', await cache.generation()) is None
+        assert await cache.get('page', generation) is None
+
+    run(check())
+
+
+def test_response_cache_invalidation_is_seen_by_every_worker(run) -> None:
+    async def check() -> None:
+        await LocalSharedCache().clear()
+        worker, other_worker = (ResponseCache(LocalSharedCache(), prefix='feed') for _ in range(2))
+        generation = await worker.generation()
+        await worker.set('page', {'body': 'posts'}, generation)
+        assert await other_worker.get('page', await other_worker.generation()) == {'body': 'posts'}
+
+        await other_worker.invalidate()
+        assert await worker.get('page', await worker.generation()) is None
+
+    run(check())
+
+
+def test_response_cache_starts_new_generation_when_evicted(run) -> None:
+    async def check() -> None:
+        backend = InMemoryCache(max_size=2)
+        cache = ResponseCache(backend, prefix='feed')
+        generation = await cache.generation()
+        await cache.set('page', {'body': 'posts'}, generation)
+        # evicts the generation token
+        await backend.set('other', 1)
+        assert await cache.generation() != generation
+
+    run(check())
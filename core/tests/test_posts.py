@@ -0,0 +1,28 @@
+"""Posts refer to categories by id, responses and payloads by title."""
+import json
+
+POST = {'title': 'titled', 'text': 'text', 'validated': False, 'category': 'category 2'}
+
+
+def test_single_post_responses_carry_category_title(client, run) -> None:
+    created = run(client.request('POST', '/api/v1/post/', POST))
+    assert created.status_code == 201, created.body
+    assert created.json()['category'] == 'category 2'
+
+    id = created.json()['id']
+    assert run(client.request('GET', f'/api/v1/post/{id}')).json()['category'] == 'category 2'
+    updated = run(client.request('PUT', f'/api/v1/post/{id}', dict(POST, category='category 3')))
+    assert updated.json()['category'] == 'category 3'
+
+
+def test_bulk_create_reports_unknown_category_per_item(client, run) -> None:
+    response = run(client.request('POST', '/api/v1/post/bulk', [POST, dict(POST, category='missing'), POST]))
+    assert response.status_code == 200, response.body
+    result = response.json()
+    assert [item['category'] for item in result['items']] == ['category 2', 'category 2']
+    assert [error['index'] for error in result['errors']] == [1]
+
+
+def test_streamed_posts_carry_category_title(client, run) -> None:
+    response = run(client.request('GET', '/api/v1/post/unvalidated', params={'stream': 'ndjson'}))
+    assert all(json.loads(line)['category'] for line in response.body.splitlines())
@@ -0,0 +1,42 @@
+"""Queries run per request of the main routes, including loads of cold caches; N+1 regressions fail here."""
+from typing import Any, Dict, Optional
+
+import pytest
+
+from db.database import query_budget
+
+POST = {'title': 'post', 'text': 'text', 'validated': True, 'category': 'category 1'}
+LOGIN = {'email': 'user1@example.com', 'password': 'benchmark'}
+
+
+@pytest.mark.parametrize('method, path, body, params, max_queries', [
+    # post lists: page, categories when their cache is cold
+    ('GET', '/api/v1/post/', None, None, 2),
+    ('GET', '/api/v1/post/', None, {'category': 'category 1', 'validated': 'true', 'order': '-time_created'}, 2),
+    ('GET', '/api/v1/post/validated', None, None, 2),
+    ('GET', '/api/v1/post/unvalidated', None, None, 2),
+    ('GET', '/api/v1/post/search', None, {'q': 'post'}, 2),
+    ('GET', '/api/v1/post/1', None, None, 2),
+    ('GET', '/api/v1/category/', None, None, 1),
+    ('POST', '/api/v1/post/', POST, None, 2),
+    ('PUT', '/api/v1/post/1/update_validated', {'validated': True}, None, 3),
+    # one INSERT in a savepoint, whatever the number of items
+    ('POST', '/api/v1/post/bulk', [POST] * 10, None, 4),
+    # one UPDATE in a savepoint per distinct new value, notification of the validated feed, categories
+    ('PATCH', '/api/v1/post/validated/bulk', [{'id': id, 'validated': id % 2 == 0} for id in range(1, 11)], None, 8),
+    ('POST', '/api/v1/user/login', LOGIN, None, 1),
+])
+def test_query_budget(
+    client, run, method: str, path: str, body: Any, params: Optional[Dict[str, Any]], max_queries: int,
+) -> None:
+    with query_budget(max_queries):
+        response = run(client.request(method, path, body, params))
+    assert response.status_code < 300, response.body
+
+
+def test_authenticated_request_query_budget(client, run) -> None:
+    token = run(client.request('POST', '/api/v1/user/login', LOGIN)).json()['access_token']
+    # principal, unless cached, and the user
+    with query_budget(2):
+        response = run(client.request('GET', '/api/v1/user/1', headers={'Authorization': f'Bearer {token}'}))
+    assert response.status_code == 200, response.body
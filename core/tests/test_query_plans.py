@@ -0,0 +1,75 @@
+"""Query plans of the post list access patterns: none of them may fall back to sequential scan of posts."""
+import datetime
+import itertools
+import json
+from typing import Any, AsyncIterator, Dict, Iterator, List, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.selectable import Select
+
+from models.post import Post
+from services.pagination import encode_cursor
+from services.post import PostSearchService, PostService
+
+
+async def statements(session: AsyncSession) -> AsyncIterator[Tuple[str, Select]]:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    service = PostService(session)
+    # cursor pointing deep into the table, pages there must cost the same as the first one
+    cursor = encode_cursor([now - datetime.timedelta(days=1), 1])
+    for name, condition in (
+        ('list', True),
+        ('list_validated', Post.validated == True),
+        ('list_unvalidated', Post.validated == False),
+    ):
+        yield name, service.list_stmt(condition)
+        yield f'{name} (deep page)', service.list_stmt(condition, cursor)
+    yield 'posts by category', select(Post.id).where(Post.category_id == 1)
+
+    # every combination of whitelisted filters, in every ordering
+    filter_values = {
+        'category': 'category 1',
+        'validated': True,
+        'created_after': now - datetime.timedelta(days=1),
+        'created_before': now - datetime.timedelta(hours=1),
+    }
+    for size in range(1, len(PostService.filters) + 1):
+        for names in itertools.combinations(PostService.filters, size):
+            for order in PostService.orderings:
+                for direction in ('', '-'):
+                    service = PostService(session)
+                    service.set_order(direction + order)
+                    condition = await service.filter_condition({name: filter_values[name] for name in names})
+                    yield f'filter {",".join(names)} order {direction}{order}', service.list_stmt(condition)
+
+    # seeded titles are numbered, so the number is a selective term
+    search_service = PostSearchService(session, 'post 12345')
+    yield 'search', search_service.list_stmt(search_service.matches())
+
+
+def scan_nodes(plan: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from scan_nodes(child)
+
+
+async def explain(session: AsyncSession, stmt: Select) -> Dict[str, Any]:
+    connection = await session.connection()
+    compiled = stmt.compile(dialect=connection.dialect, compile_kwargs={'render_postcompile': True})
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    res = await connection.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {compiled}', params)
+    plan = res.scalar()
+    return (json.loads(plan) if isinstance(plan, str) else plan)[0]['Plan']
+
+
+def test_post_lists_do_not_scan_posts(session, run):
+    async def seq_scans() -> List[str]:
+        failures = []
+        async for name, stmt in statements(session):
+            plan = await explain(session, stmt)
+            if any(node['Node Type'] == 'Seq Scan' and node.get('Relation Name') == 'posts' for node in scan_nodes(plan)):
+                failures.append(name)
+        return failures
+
+    assert run(seq_scans()) == []
@@ -0,0 +1,71 @@
+"""Caches filled on reads routed to a replica must not keep what the replica has not replayed yet."""
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import db.database
+from db.database import async_session
+from models.user import User
+from services.user import principal_cache
+
+
+class LaggingReplica:
+    """Replica sessions of get_db, all of them the same session stuck on an old snapshot."""
+
+    def __init__(self, session: AsyncSession) -> None:
+        self._session = session
+
+    def __bool__(self) -> bool:
+        return True
+
+    def session(self, *args) -> AsyncSession:
+        return self._session
+
+
+async def lagging_session() -> AsyncSession:
+    """Read-only session seeing none of the writes committed after it was opened."""
+    session = async_session(info={'read_only': True})
+    await session.connection(execution_options={'isolation_level': 'REPEATABLE READ'})
+    # snapshot is taken by the first query
+    await session.execute(select(func.now()))
+    return session
+
+
+def test_validated_feed_is_not_filled_from_lagging_replica(client, run, monkeypatch) -> None:
+    first_page = run(client.request('GET', '/api/v1/post/validated', params={'limit': 1})).json()
+    id = first_page['items'][0]['id']
+    replica_session = run(lagging_session())
+
+    response = run(client.request('PUT', f'/api/v1/post/{id}/update_validated', {'validated': False}))
+    assert response.status_code == 200, response.body
+    try:
+        monkeypatch.setattr(db.database, 'replicas', LaggingReplica(replica_session))
+        # miss, then hit of the page cached by it
+        for _ in range(2):
+            page = run(client.request('GET', '/api/v1/post/validated', params={'limit': 1})).json()
+            assert page['items'][0]['id'] != id
+    finally:
+        run(replica_session.close())
+        run(client.request('PUT', f'/api/v1/post/{id}/update_validated', {'validated': True}))
+
+
+def test_principal_is_not_filled_from_lagging_replica(database, run, monkeypatch) -> None:
+    email = 'user10@example.com'
+
+    async def set_active(active: bool) -> None:
+        async with async_session() as session:
+            await session.execute(update(User).where(User.email == email).values(active=active))
+            await principal_cache.invalidate(session, email)
+            await session.commit()
+
+    async def check() -> None:
+        assert (await principal_cache.get(email, replica_session)).active
+        await set_active(False)
+        monkeypatch.setattr(db.database, 'replicas', LaggingReplica(replica_session))
+        assert not (await principal_cache.get(email, replica_session)).active
+
+    replica_session = run(lagging_session())
+    try:
+        run(check())
+    finally:
+        run(replica_session.close())
+        run(set_active(True))
@@ -0,0 +1,22 @@
+"""Whole result sets streamed from server-side cursors of read-only sessions."""
+import json
+
+import pytest
+
+
+@pytest.mark.parametrize('path', ['/api/v1/post/', '/api/v1/post/validated', '/api/v1/post/unvalidated'])
+def test_stream_ndjson(client, run, path: str) -> None:
+    response = run(client.request('GET', path, params={'stream': 'ndjson'}))
+    assert response.status_code == 200, response.body
+    items = [json.loads(line) for line in response.body.splitlines()]
+    assert items
+    # newest first, as pages are
+    assert [item['time_created'] for item in items] == sorted((item['time_created'] for item in items), reverse=True)
+
+
+def test_stream_json_array(client, run) -> None:
+    response = run(client.request('GET', '/api/v1/post/', params={'stream': 'json'}))
+    assert response.status_code == 200, response.body
+    items = response.json()
+    assert items
+    assert len({item['id'] for item in items}) == len(items)
@@ -0,0 +1,20 @@
+"""User updates: single statement, tokens of the replaced email stop resolving to the user."""
+from db.database import query_budget
+
+
+def test_email_change_invalidates_previous_principal(client, run) -> None:
+    login = {'email': 'user9@example.com', 'password': 'benchmark'}
+    token = run(client.request('POST', '/api/v1/user/login', login)).json()['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+    user = run(client.request('GET', '/api/v1/user/9', headers=headers))
+    assert user.status_code == 200, user.body
+
+    # principal is cached by now: UPDATE ... RETURNING with the previous email, NOTIFY of both emails
+    with query_budget(3):
+        response = run(client.request(
+            'PUT', '/api/v1/user/9', {'username': 'user9', 'email': 'renamed9@example.com'}, headers=headers,
+        ))
+    assert response.status_code == 200, response.body
+    assert response.json()['email'] == 'renamed9@example.com'
+
+    assert run(client.request('GET', '/api/v1/user/9', headers=headers)).status_code == 401